@@ -0,0 +1,73 @@
+"""
+模拟百度地图上游（压测用）
+- /panorama/v2：返回固定大小的 JPEG 数据
+- 其他路径：按扩展名返回脚本/样式（文本）或瓦片（二进制），带 Cache-Control 与 ETag
+- 与百度 CDN 一致，请求接受 gzip 时脚本以 gzip 压缩返回；样式不压缩
+
+用法：python -m bench.mock_baidu --port 9102 --latency 0.05
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import os
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+
+# JPEG 文件头 + 随机内容，模拟一张全景图
+PANORAMA_BYTES = b"\xff\xd8\xff\xe0" + os.urandom(60 * 1024)
+TILE_BYTES = b"\x89PNG\r\n\x1a\n" + os.urandom(12 * 1024)
+SCRIPT_TEXT = ("/* mock baidu map api */\n" + "var BMap=BMap||{};\n" * 4000).encode()
+SCRIPT_GZIP = gzip.compress(SCRIPT_TEXT)
+STYLE_TEXT = ("/* mock baidu map style */\n" + ".BMap_mask{background:#fff}\n" * 2000).encode()
+
+
+def create_app(latency: float) -> FastAPI:
+    app = FastAPI()
+    stats = {"requests": 0}
+
+    @app.get("/panorama/v2")
+    async def panorama():
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        return Response(content=PANORAMA_BYTES, media_type="image/jpeg")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.get("/{path:path}")
+    async def resource(path: str, request: Request):
+        stats["requests"] += 1
+        await asyncio.sleep(latency)
+        headers = {"Cache-Control": "max-age=3600"}
+        if path.endswith(".css"):
+            body, media_type = STYLE_TEXT, "text/css"
+        elif path.endswith(".js") or "getscript" in path or path == "api":
+            body, media_type = SCRIPT_TEXT, "application/javascript"
+        else:
+            body, media_type = TILE_BYTES, "image/png"
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers["ETag"] = etag
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers={"ETag": etag})
+        if body is SCRIPT_TEXT and "gzip" in request.headers.get("accept-encoding", ""):
+            body = SCRIPT_GZIP
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type=media_type, headers=headers)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟百度地图上游")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9102)
+    parser.add_argument("--latency", type=float, default=0.05, help="响应延迟（秒）")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+模拟 OpenAI 兼容的大模型服务（压测用）
+- /v1/chat/completions 支持普通与流式（stream=true）返回
+- 可配置首 token 延迟、输出速率（token/秒）及错误注入比例
+
+用法：python -m bench.mock_llm --port 9101 --latency 0.5 --token-rate 50 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+REPLY = {
+    "total_info": "（共1人报警，住户）",
+    "callers": [{
+        "identity": "住户",
+        "phone": "13800138000",
+        "summary": "厨房起火，本人被困阳台，已通知物业",
+        "isTrapped": True
+    }]
+}
+
+# 按约 4 个字符一个 token 切分输出
+CHUNK_CHARS = 4
+
+
+def create_app(latency: float, token_rate: float, error_rate: float) -> FastAPI:
+    app = FastAPI()
+    stats = {"requests": 0, "errors": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=503, content={"error": {"message": "mock overloaded"}})
+
+        content = json.dumps(REPLY, ensure_ascii=False)
+        chunks = [content[i:i + CHUNK_CHARS] for i in range(0, len(content), CHUNK_CHARS)]
+        interval = 1 / token_rate if token_rate > 0 else 0
+        prompt_chars = sum(len(m.get("content") or "") for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // 2,
+            "completion_tokens": len(chunks),
+            "total_tokens": prompt_chars // 2 + len(chunks),
+        }
+        created = int(time.time())
+
+        await asyncio.sleep(latency)
+
+        if not body.get("stream"):
+            await asyncio.sleep(interval * len(chunks))
+            return {
+                "id": "mock", "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        async def events():
+            for chunk in chunks:
+                data = {
+                    "id": "mock", "object": "chat.completion.chunk", "created": created, "model": body.get("model"),
+                    "choices": [{"index": 0, "delta": {"content": chunk}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(interval)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟大模型服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9101)
+    parser.add_argument("--latency", type=float, default=0.5, help="首 token 延迟（秒）")
+    parser.add_argument("--token-rate", type=float, default=50, help="输出速率（token/秒），0 表示不限")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的比例")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.token_rate, args.error_rate),
+                host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+离线压测：启动模拟大模型与模拟百度上游，再以不同并发压测本服务的主要接口
+- 接口：/summary/generate、/summary/generate_incremental、/panorama、/panorama/baidu-proxy
+- 输出每个接口、每个并发级别的 p50/p95/p99 延迟、RPS、错误数及服务进程 RSS
+- 结果保存为 JSON（默认 bench/results/<时间>.json），便于比较不同版本
+
+用法：python -m bench.run --concurrency 1,8,32 --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+API_PREFIX = "/api/v1"
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def process_rss_mb(pid: int) -> Optional[float]:
+    """读取进程常驻内存（MB）：优先 psutil，其次 /proc；都不可用时返回 None"""
+    try:
+        import psutil
+        return round(psutil.Process(pid).memory_info().rss / 1024 / 1024, 1)
+    except ImportError:
+        pass
+    except Exception:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def start_process(args: List[str], env: Optional[Dict[str, str]] = None) -> subprocess.Popen:
+    return subprocess.Popen(
+        [sys.executable, *args], cwd=ROOT,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+async def wait_ready(url: str, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待服务就绪超时: {url}")
+
+
+# ====== 请求构造：每次调用返回 (方法, 路径, 参数) ======
+
+def summary_request(i: int, distinct: int) -> dict:
+    """distinct 控制不同请求的数量：小于请求总数时可测到缓存命中"""
+    n = i % distinct
+    return {
+        "incidentId": f"bench-{n}",
+        "summaryType": 1,
+        "guideTypeName": "火灾",
+        "prompt": "提取身份、电话、是否被困",
+        "allAnswers": {
+            f"1380000{n:04d}": {"哪里着火了": "厨房起火", "有人被困吗": "我被困在阳台"},
+            f"1390000{n:04d}": {"看到什么": "楼道有浓烟"},
+        },
+    }
+
+
+def incremental_request(i: int, distinct: int) -> dict:
+    return {
+        "case_id": f"bench-inc-{i % distinct}",
+        "caller_id": "main_caller",
+        "question": f"问题{i}",
+        "answer": f"回答{i}，厨房起火",
+        "guidance_type": "火灾",
+        "prompt": "提取身份、电话、是否被困",
+    }
+
+
+def scenarios(distinct: int) -> Dict[str, Callable[[int], tuple]]:
+    return {
+        "summary_generate": lambda i: ("POST", f"{API_PREFIX}/summary/generate", {"json": summary_request(i, distinct)}),
+        "summary_incremental": lambda i: ("POST", f"{API_PREFIX}/summary/generate_incremental", {"json": incremental_request(i, distinct)}),
+        "panorama": lambda i: ("GET", f"{API_PREFIX}/panorama", {"params": {
+            "location": f"116.{(i % distinct):05d},39.90000", "heading": (i * 45) % 360}}),
+        "baidu_proxy": lambda i: ("GET", f"{API_PREFIX}/panorama/baidu-proxy/tile/{i % distinct}.png", {"params": {
+            "host": "apimaponline1.bdimg.com", "x": i % distinct}}),
+    }
+
+
+async def run_level(client: httpx.AsyncClient, build: Callable[[int], tuple], total: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    counter = iter(range(total))
+
+    async def worker():
+        for i in counter:
+            method, path, kwargs = build(i)
+            start = time.perf_counter()
+            try:
+                resp = await client.request(method, path, **kwargs)
+                await resp.aread()
+                status = str(resp.status_code)
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "duration_s": round(elapsed, 3),
+        "rps": round(total / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+        "statuses": statuses,
+        "errors": sum(n for s, n in statuses.items() if not s.startswith("2")),
+    }
+
+
+async def run(args):
+    llm_port, baidu_port, service_port = args.llm_port, args.baidu_port, args.port
+    mocks = [
+        start_process(["-m", "bench.mock_llm", "--port", str(llm_port), "--latency", str(args.llm_latency),
+                       "--token-rate", str(args.llm_token_rate), "--error-rate", str(args.llm_error_rate)]),
+        start_process(["-m", "bench.mock_baidu", "--port", str(baidu_port),
+                       "--latency", str(args.baidu_latency)]),
+    ]
+    service_env = {
+        "BASE_URL": f"http://127.0.0.1:{llm_port}/v1",
+        "API_KEY": "bench",
+        "PANORAMA_API_URL": f"http://127.0.0.1:{baidu_port}/panorama/v2",
+        "PANORAMA_API_KEY": "bench",
+        "BAIDU_PROXY_UPSTREAM": f"http://127.0.0.1:{baidu_port}",
+        "API_PREFIX": API_PREFIX,
+        "LOG_LEVEL": "WARNING",
+    }
+    service = start_process(
+        ["-m", "uvicorn", "main:app", "--port", str(service_port), "--log-level", "warning"], service_env)
+
+    base_url = f"http://127.0.0.1:{service_port}"
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": _git_revision(),
+        "config": vars(args),
+        "scenarios": {},
+    }
+    try:
+        await wait_ready(f"http://127.0.0.1:{llm_port}/stats")
+        await wait_ready(f"http://127.0.0.1:{baidu_port}/stats")
+        await wait_ready(f"{base_url}/health")
+        results["rss_mb_start"] = process_rss_mb(service.pid)
+
+        limits = httpx.Limits(max_connections=max(args.concurrency) * 2)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            selected = args.scenarios or list(scenarios(args.distinct))
+            for name in selected:
+                build = scenarios(args.distinct)[name]
+                levels = []
+                for concurrency in args.concurrency:
+                    level = await run_level(client, build, args.requests, concurrency)
+                    level["rss_mb"] = process_rss_mb(service.pid)
+                    levels.append(level)
+                    print(f"{name:<22} c={concurrency:<4} rps={level['rps']:<9} p50={level['p50_ms']}ms "
+                          f"p95={level['p95_ms']}ms p99={level['p99_ms']}ms errors={level['errors']} "
+                          f"rss={level['rss_mb']}MB", flush=True)
+                results["scenarios"][name] = levels
+        results["rss_mb_end"] = process_rss_mb(service.pid)
+    finally:
+        for proc in [service, *mocks]:
+            proc.terminate()
+        for proc in [service, *mocks]:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    output = Path(args.output) if args.output else \
+        ROOT / "bench" / "results" / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果已保存: {output}")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指引总结服务离线压测")
+    parser.add_argument("--concurrency", default="1,8,32",
+                        type=lambda s: [int(v) for v in s.split(",")], help="并发级别，逗号分隔")
+    parser.add_argument("--requests", type=int, default=200, help="每个并发级别的请求数")
+    parser.add_argument("--distinct", type=int, default=50, help="不同请求内容的数量（影响缓存命中）")
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=None,
+                        help="只压测指定接口：summary_generate,summary_incremental,panorama,baidu_proxy")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--port", type=int, default=9100, help="被测服务端口")
+    parser.add_argument("--llm-port", type=int, default=9101)
+    parser.add_argument("--baidu-port", type=int, default=9102)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--llm-token-rate", type=float, default=200)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--baidu-latency", type=float, default=0.05)
+    parser.add_argument("--output", default=None, help="结果文件路径")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
 from loguru import logger
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import random
 import sys
+import threading
+from logging.handlers import RotatingFileHandler
 from pathlib import Path
+from typing import Callable, Dict, Optional
 from config.settings import settings
+from core.tracing import current_trace_id
 
 LOG_DIR = Path("logs")
 LOG_DIR.mkdir(exist_ok=True)
@@ -15,15 +25,130 @@ loguru的logger是一个全局单例
 # 移除默认配置
 logger.remove()
 
+
+def _add_trace_id(record):
+    """每条日志附带当前请求的 trace id（格式中用 {extra[trace_id]}，LOG_JSON 时包含在 extra 中）"""
+    record["extra"].setdefault("trace_id", current_trace_id() or "-")
+
+
+logger.configure(patcher=_add_trace_id)
+
 # 定义loguru格式
-loguru_format = "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
+loguru_format = "<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | {extra[trace_id]} | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 log_format = settings.LOG_FORMAT or loguru_format
+
+# WARNING 及以上级别在队列满时最多等待的时间（秒），低级别日志直接丢弃
+IMPORTANT_LEVEL_NO = 30
+IMPORTANT_PUT_TIMEOUT = 0.1
+
+
+class BoundedQueueSink:
+    """
+    有界队列日志输出：调用方只做入队，由后台线程写出
+    - 队列满时丢弃 INFO/DEBUG 日志（WARNING 及以上短暂等待后再丢弃），不阻塞事件循环
+    - 记录写出、丢弃数量及队列长度，便于观察日志背压
+    """
+
+    def __init__(self, name: str, write: Callable[[str], None], flush: Callable[[], None], max_size: int):
+        self.name = name
+        self._write = write
+        self._flush = flush
+        self._queue: queue.Queue = queue.Queue(maxsize=max_size)
+        self.max_size = max_size
+        self.written = 0
+        self.dropped = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"log-sink-{name}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message):
+        try:
+            if message.record["level"].no >= IMPORTANT_LEVEL_NO:
+                self._queue.put(str(message), timeout=IMPORTANT_PUT_TIMEOUT)
+            else:
+                self._queue.put_nowait(str(message))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            try:
+                self._write(item)
+                # 队列中暂无更多日志时才刷新，批量写入
+                if self._queue.empty():
+                    self._flush()
+            except Exception:
+                pass
+            self.written += 1
+        self._flush()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "max_size": self.max_size,
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+class _RotatingWriter:
+    """按大小轮转的文本文件写出（仅在后台线程中调用）"""
+
+    def __init__(self, path: Path, max_bytes: int, backups: int):
+        self.handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        self.handler.setFormatter(logging.Formatter("%(message)s"))
+
+    def write(self, text: str):
+        self.handler.emit(logging.makeLogRecord({"msg": text.rstrip("\n")}))
+
+    def flush(self):
+        self.handler.flush()
+
+
+def worker_log_path(path: Path) -> Path:
+    """
+    多 worker 部署时在文件名后加进程号（guide-summary.log -> guide-summary.1234.log）
+    RotatingFileHandler 不支持多进程写同一文件，共用文件时轮转会互相覆盖
+    """
+    path = Path(path)
+    if settings.WORKERS <= 1:
+        return path
+    return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+
+
+_sinks: Dict[str, BoundedQueueSink] = {}
+
+
+def sink_stats() -> Dict[str, dict]:
+    """各日志输出的队列与丢弃统计"""
+    return {name: sink.stats() for name, sink in _sinks.items()}
+
+
+def shutdown_logging():
+    """写完队列中剩余日志并停止后台线程"""
+    for sink in _sinks.values():
+        sink.close()
+    _sinks.clear()
+
+
+# 进程退出时写完队列中剩余的日志
+atexit.register(shutdown_logging)
+
 # 添加控制台输出
+_sinks["console"] = BoundedQueueSink(
+    "console", sys.stdout.write, sys.stdout.flush, settings.LOG_QUEUE_SIZE)
 logger.add(
-    sys.stdout,
+    _sinks["console"],
     format=log_format,  # 使用log_format
     level=settings.LOG_LEVEL,
-    enqueue=True,
     colorize=True,
 )
 
@@ -32,14 +157,19 @@ logger.add(
 
 def setup_file_logging():
     try:
+        writer = _RotatingWriter(
+            worker_log_path(LOG_DIR / ("guide-summary.jsonl" if settings.LOG_JSON else "guide-summary.log")),
+            settings.LOG_FILE_MB * 1024 * 1024,
+            settings.LOG_FILE_BACKUPS
+        )
+        _sinks["file"] = BoundedQueueSink(
+            "file", writer.write, writer.flush, settings.LOG_QUEUE_SIZE)
         logger.add(
-            LOG_DIR / "guide-summary.log",
-            rotation="1 MB",
-            retention="30 days",
+            _sinks["file"],
             format=log_format,
             level=settings.LOG_LEVEL,
-            encoding="utf-8",
-            enqueue=True,
+            # LOG_JSON=True 时每行输出一条结构化 JSON 记录
+            serialize=settings.LOG_JSON,
             catch=True,
         )
         logger.info("文件日志初始化成功")
@@ -51,6 +181,20 @@ def setup_file_logging():
 # 在应用启动后调用
 setup_file_logging()
 
+
+def payload_digest(text: Optional[str]) -> str:
+    """大段内容（提示词、问答记录）只记录长度与哈希，不输出原文"""
+    if not text:
+        return "len=0"
+    return f"len={len(text)} sha1={hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]}"
+
+
+def sample_payload() -> bool:
+    """按 LOG_PAYLOAD_SAMPLE_RATE 抽样输出完整内容（默认 0，不输出）"""
+    rate = settings.LOG_PAYLOAD_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
 # 可选：处理uvicorn日志
 
 # def filter_uvicorn(record):
@@ -12,17 +12,179 @@ class Settings:
     LLM_MODEL = config('LLM_MODEL', default='deepseek-chat')
     LLM_TEMPERATURE = config('LLM_TEMPERATURE', default=0.3, cast=float)
     LLM_MAX_TOKENS = config('LLM_MAX_TOKENS', default=500, cast=int)
+    # 上下文预算（输入 + 输出 token），超出时按优先级裁剪输入
+    LLM_CONTEXT_BUDGET = config('LLM_CONTEXT_BUDGET', default=16000, cast=int)
+    # 按模型单独配置预算，格式：模型名:预算,模型名:预算
+    LLM_MODEL_BUDGETS = config('LLM_MODEL_BUDGETS', default='', cast=Csv())
+    # 要求大模型服务端以 JSON 对象格式输出（response_format=json_object，需服务端支持）
+    LLM_JSON_MODE = config('LLM_JSON_MODE', default=False, cast=bool)
+
+    # 多后端路由：JSON 列表，每项包含 base_url、api_key、model（可选 name）；为空时只用上面的单个后端
+    LLM_BACKENDS = config('LLM_BACKENDS', default='')
+    # 延迟/错误率移动平均系数
+    LLM_EWMA_ALPHA = config('LLM_EWMA_ALPHA', default=0.3, cast=float)
+    # 对冲请求：首个请求超过该延迟（或该后端 p95，取较大值，单位秒）未返回时向另一后端补发
+    LLM_HEDGE_ENABLED = config('LLM_HEDGE_ENABLED', default=False, cast=bool)
+    LLM_HEDGE_DELAY = config('LLM_HEDGE_DELAY', default=3.0, cast=float)
+    # 熔断：连续失败次数阈值与冷却时间（秒）
+    LLM_BREAKER_FAILURES = config('LLM_BREAKER_FAILURES', default=3, cast=int)
+    LLM_BREAKER_COOLDOWN = config('LLM_BREAKER_COOLDOWN', default=30.0, cast=float)
+
+    # 大模型调用准入控制：全局并发上限（0 为不限制），超出的按优先级排队
+    LLM_MAX_CONCURRENCY = config('LLM_MAX_CONCURRENCY', default=32, cast=int)
+    # 各优先级排队期限（秒），按 增量,完整,批量 顺序；预计或实际超过期限时返回 429
+    LLM_QUEUE_DEADLINES = config('LLM_QUEUE_DEADLINES', default='5,15,60', cast=Csv())
+    # 大模型调用频率上限：所有 worker 合计每分钟最多调用次数（0 为不限制），超出时返回 429
+    LLM_RATE_LIMIT_PER_MIN = config('LLM_RATE_LIMIT_PER_MIN', default=0, cast=int)
+
+    # 大模型连接池配置（应用生命周期内共享一个客户端）
+    LLM_POOL_MAX_CONNECTIONS = config(
+        'LLM_POOL_MAX_CONNECTIONS', default=100, cast=int)
+    LLM_POOL_MAX_KEEPALIVE = config(
+        'LLM_POOL_MAX_KEEPALIVE', default=20, cast=int)
+    LLM_KEEPALIVE_EXPIRY = config(
+        'LLM_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+    LLM_CONNECT_TIMEOUT = config('LLM_CONNECT_TIMEOUT', default=5.0, cast=float)
+    LLM_READ_TIMEOUT = config('LLM_READ_TIMEOUT', default=60.0, cast=float)
+
+    # 完整总结结果缓存（相同请求重试时直接返回）
+    SUMMARY_CACHE_ENABLED = config(
+        'SUMMARY_CACHE_ENABLED', default=True, cast=bool)
+    SUMMARY_CACHE_TTL = config('SUMMARY_CACHE_TTL', default=600, cast=int)
+    SUMMARY_CACHE_MB = config('SUMMARY_CACHE_MB', default=32, cast=int)
+
+    # 多报警人分治总结（summary_type 1/3）：报警人数达到阈值时逐人并行总结再归并（多次调用大模型，
+    # summary_type=1 的 total_info 改为本地汇总），0 表示关闭（默认），如需开启可设为 4
+    MAP_REDUCE_MIN_CALLERS = config(
+        'MAP_REDUCE_MIN_CALLERS', default=0, cast=int)
+    CALLER_CACHE_TTL = config('CALLER_CACHE_TTL', default=1800, cast=int)
+    CALLER_CACHE_MB = config('CALLER_CACHE_MB', default=16, cast=int)
+
+    # 批量总结：单次最多条数及同时生成的案件数
+    SUMMARY_BATCH_MAX_ITEMS = config(
+        'SUMMARY_BATCH_MAX_ITEMS', default=200, cast=int)
+    SUMMARY_BATCH_CONCURRENCY = config(
+        'SUMMARY_BATCH_CONCURRENCY', default=8, cast=int)
+
+    # 多进程部署：当前 worker 数（由 serve.py 设置），全局并发上限按此分摊到每个 worker
+    WORKERS = config('WEB_CONCURRENCY', default=1, cast=int)
+    # 多 worker 共享存储（SQLite 文件），保存结果缓存、会话与限流计数；为空时各 worker 使用进程内缓存
+    SHARED_STORE_PATH = config('SHARED_STORE_PATH', default='')
+    # 共享存储等待其他 worker 写锁的最长时间（毫秒）；在事件循环中同步调用，超时即放弃（缓存未命中、限流放行）
+    SHARED_STORE_BUSY_TIMEOUT_MS = config('SHARED_STORE_BUSY_TIMEOUT_MS', default=100, cast=int)
+    # 生产启动参数（python serve.py）：监听地址、worker 数及关闭时等待进行中请求的秒数
+    SERVE_HOST = config('SERVE_HOST', default='0.0.0.0')
+    SERVE_PORT = config('SERVE_PORT', default=8000, cast=int)
+    SERVE_WORKERS = config('SERVE_WORKERS', default=1, cast=int)
+    SERVE_GRACEFUL_TIMEOUT = config('SERVE_GRACEFUL_TIMEOUT', default=30, cast=int)
+
+    # 增量总结会话（服务端按案件+报警人保存最新摘要）
+    SESSION_TTL = config('SESSION_TTL', default=7200, cast=int)
+    SESSION_MAX_COUNT = config('SESSION_MAX_COUNT', default=10000, cast=int)
+    SESSION_MAX_MB = config('SESSION_MAX_MB', default=64, cast=int)
+    # 增量问答合并窗口（毫秒，0 表示不合并）及单批最多问答数
+    INCREMENTAL_COALESCE_WINDOW_MS = config(
+        'INCREMENTAL_COALESCE_WINDOW_MS', default=0, cast=int)
+    INCREMENTAL_COALESCE_MAX_PAIRS = config(
+        'INCREMENTAL_COALESCE_MAX_PAIRS', default=10, cast=int)
+
+    # 启动预热：后台导入依赖、解析域名并预先连接大模型与百度上游，完成前 /ready 返回 503
+    WARMUP_ENABLED = config('WARMUP_ENABLED', default=True, cast=bool)
+    WARMUP_TIMEOUT = config('WARMUP_TIMEOUT', default=10.0, cast=float)
+    # 额外预连接的百度地图资源域名（如 apimaponline0.bdimg.com），逗号分隔
+    WARMUP_BAIDU_HOSTS = config('WARMUP_BAIDU_HOSTS', default='', cast=Csv())
+
+    # Prometheus 指标（/metrics）
+    METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+
+    # 链路追踪：trace id 请求头、采样比例（0~1）及轮转的 JSONL 输出文件
+    TRACE_HEADER = config('TRACE_HEADER', default='X-Trace-Id')
+    TRACE_SAMPLE_RATE = config('TRACE_SAMPLE_RATE', default=0.01, cast=float)
+    TRACE_FILE = config('TRACE_FILE', default='logs/trace.jsonl')
+    TRACE_FILE_MB = config('TRACE_FILE_MB', default=20, cast=int)
+    TRACE_FILE_BACKUPS = config('TRACE_FILE_BACKUPS', default=5, cast=int)
 
     # 日志配置
     LOG_LEVEL = config('LOG_LEVEL', default='INFO')
+    # 可使用 {extra[trace_id]} 输出当前请求的 trace id（不在请求中时为 -）
     LOG_FORMAT = config(
-        'LOG_FORMAT', default='{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {name}:{line} - {message}')
+        'LOG_FORMAT', default='{time:YYYY-MM-DD HH:mm:ss.SSS} | {level: <8} | {extra[trace_id]} | {name}:{line} - {message}')
+    # 文件日志输出为 JSON（每行一条记录）
+    LOG_JSON = config('LOG_JSON', default=False, cast=bool)
+    # 日志文件按大小轮转（MB）及保留的文件数
+    LOG_FILE_MB = config('LOG_FILE_MB', default=20, cast=int)
+    LOG_FILE_BACKUPS = config('LOG_FILE_BACKUPS', default=10, cast=int)
+    # 日志异步队列长度，满时丢弃低级别日志并计数
+    LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+    # 完整提示词/问答内容的抽样输出比例（0~1，默认只记录长度与哈希）
+    LOG_PAYLOAD_SAMPLE_RATE = config('LOG_PAYLOAD_SAMPLE_RATE', default=0.0, cast=float)
 
     # 百度全景图配置
     PANORAMA_API_URL = config(
         'PANORAMA_API_URL', default='https://api.map.baidu.com/panorama/v2')
     PANORAMA_API_KEY = config('PANORAMA_API_KEY', default='')
 
+    # 全景图缓存（坐标按精度取整后作为缓存键的一部分）
+    PANORAMA_CACHE_ENABLED = config(
+        'PANORAMA_CACHE_ENABLED', default=True, cast=bool)
+    PANORAMA_CACHE_TTL = config('PANORAMA_CACHE_TTL', default=21600, cast=int)
+    PANORAMA_CACHE_MB = config('PANORAMA_CACHE_MB', default=128, cast=int)
+    PANORAMA_CACHE_PRECISION = config(
+        'PANORAMA_CACHE_PRECISION', default=5, cast=int)
+    # 全景图邻近视角预取（默认关闭）：返回一个视角后在后台预取同一位置 heading ± 步长×1..N 的视角到全景图缓存
+    PANORAMA_PREFETCH_ENABLED = config(
+        'PANORAMA_PREFETCH_ENABLED', default=False, cast=bool)
+    PANORAMA_PREFETCH_STEP = config('PANORAMA_PREFETCH_STEP', default=90, cast=int)
+    PANORAMA_PREFETCH_NEIGHBORS = config(
+        'PANORAMA_PREFETCH_NEIGHBORS', default=1, cast=int)
+    # 同一位置同时进行的预取数，及全部预取任务数上限（超出时丢弃）
+    PANORAMA_PREFETCH_PER_LOCATION = config(
+        'PANORAMA_PREFETCH_PER_LOCATION', default=2, cast=int)
+    PANORAMA_PREFETCH_MAX_PENDING = config(
+        'PANORAMA_PREFETCH_MAX_PENDING', default=32, cast=int)
+    # 预取配额：所有 worker 合计每分钟最多预取次数（经共享存储计数），保护百度 API 配额
+    PANORAMA_PREFETCH_PER_MIN = config(
+        'PANORAMA_PREFETCH_PER_MIN', default=60, cast=int)
+    # 多视角全景图（/panorama/multi）：单次最多视角数，及拼接长图的 JPEG 质量（需安装 Pillow）
+    PANORAMA_MULTI_MAX_VIEWS = config(
+        'PANORAMA_MULTI_MAX_VIEWS', default=8, cast=int)
+    PANORAMA_SPRITE_QUALITY = config(
+        'PANORAMA_SPRITE_QUALITY', default=85, cast=int)
+
+    # 代理上游地址覆盖：设置后 /panorama/baidu-proxy 的请求统一转发到该地址（如压测用的模拟服务），为空时按 host 参数转发
+    BAIDU_PROXY_UPSTREAM = config('BAIDU_PROXY_UPSTREAM', default='')
+
+    # 百度上游连接池配置（代理与全景图共享）
+    BAIDU_HTTP2 = config('BAIDU_HTTP2', default=True, cast=bool)
+    BAIDU_POOL_MAX_CONNECTIONS = config(
+        'BAIDU_POOL_MAX_CONNECTIONS', default=200, cast=int)
+    BAIDU_POOL_MAX_KEEPALIVE = config(
+        'BAIDU_POOL_MAX_KEEPALIVE', default=50, cast=int)
+    BAIDU_POOL_PER_HOST = config('BAIDU_POOL_PER_HOST', default=20, cast=int)
+    BAIDU_KEEPALIVE_EXPIRY = config(
+        'BAIDU_KEEPALIVE_EXPIRY', default=60.0, cast=float)
+    BAIDU_CONNECT_TIMEOUT = config(
+        'BAIDU_CONNECT_TIMEOUT', default=5.0, cast=float)
+    BAIDU_READ_TIMEOUT = config('BAIDU_READ_TIMEOUT', default=30.0, cast=float)
+
+    # 百度地图资源代理缓存（内存 LRU + 磁盘）
+    PROXY_CACHE_ENABLED = config('PROXY_CACHE_ENABLED', default=True, cast=bool)
+    PROXY_CACHE_MEMORY_MB = config('PROXY_CACHE_MEMORY_MB', default=64, cast=int)
+    PROXY_CACHE_MAX_ENTRY_KB = config(
+        'PROXY_CACHE_MAX_ENTRY_KB', default=4096, cast=int)
+    PROXY_CACHE_DISK_DIR = config(
+        'PROXY_CACHE_DISK_DIR', default='cache/baidu-proxy')
+    PROXY_CACHE_DISK_MB = config('PROXY_CACHE_DISK_MB', default=1024, cast=int)
+    PROXY_CACHE_DEFAULT_TTL = config(
+        'PROXY_CACHE_DEFAULT_TTL', default=3600, cast=int)
+    # 代理流式转发：边收边发，每次读取的块大小（即单个请求的转发缓冲上限）
+    PROXY_STREAMING = config('PROXY_STREAMING', default=True, cast=bool)
+    PROXY_STREAM_CHUNK_KB = config('PROXY_STREAM_CHUNK_KB', default=64, cast=int)
+    # 代理压缩：上游压缩内容在浏览器支持时原样转发，未压缩的文本资源（JS/CSS 等）压缩后转发并缓存压缩版本
+    PROXY_COMPRESSION = config('PROXY_COMPRESSION', default=True, cast=bool)
+    PROXY_GZIP_LEVEL = config('PROXY_GZIP_LEVEL', default=6, cast=int)
+    PROXY_GZIP_MIN_BYTES = config('PROXY_GZIP_MIN_BYTES', default=1024, cast=int)
+
     # 动态获取任何配置
     @staticmethod
     def get(key: str, default=None, cast=None):
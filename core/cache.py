@@ -0,0 +1,225 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from core.shared_store import SharedStore
+
+
+class LRUCache:
+    """
+    按字节数（及可选条目数）限制容量的 LRU 缓存
+    - 调用方在写入时给出条目大小，超出容量时淘汰最久未使用的条目
+    - 仅在事件循环线程内使用，不加锁
+    """
+
+    def __init__(self, max_bytes: int, max_items: Optional[int] = None):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.current_bytes = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        self._data.move_to_end(key)
+        return item[0]
+
+    def set(self, key: Hashable, value: Any, size: int) -> bool:
+        """写入缓存，单个条目超过总容量时不缓存并返回 False"""
+        if size > self.max_bytes:
+            self.pop(key)
+            return False
+
+        self.pop(key)
+        self._data[key] = (value, size)
+        self.current_bytes += size
+        self._evict()
+        return True
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        item = self._data.pop(key, None)
+        if item is None:
+            return None
+        self.current_bytes -= item[1]
+        return item[0]
+
+    def clear(self):
+        self._data.clear()
+        self.current_bytes = 0
+
+    def _evict(self):
+        while self._data and (
+            self.current_bytes > self.max_bytes
+            or (self.max_items is not None and len(self._data) > self.max_items)
+        ):
+            _, (_, size) = self._data.popitem(last=False)
+            self.current_bytes -= size
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class TTLCache(LRUCache):
+    """带过期时间的 LRU 缓存，过期条目在读取时清除"""
+
+    def __init__(self, ttl: float, max_bytes: int, max_items: Optional[int] = None):
+        super().__init__(max_bytes, max_items)
+        self.ttl = ttl
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = super().get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if time.time() >= expires_at:
+            self.pop(key)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any, size: int, ttl: Optional[float] = None) -> bool:
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        return super().set(key, (value, expires_at), size)
+
+
+class SingleFlight:
+    """
+    合并相同键的并发调用：同一时刻只执行一次，其余调用方等待同一结果
+    发起方被取消（如客户端断开）时，任务仍会继续执行完供其他等待方使用
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了进行中的调用)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task), shared
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._calls
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+class UncacheableResult(Exception):
+    """加载函数抛出此异常表示结果照常返回给调用方（含合并等待方），但不写入缓存"""
+
+    def __init__(self, value: Any):
+        self.value = value
+        super().__init__("uncacheable result")
+
+
+class CoalescingCache:
+    """
+    TTL 缓存 + 并发请求合并 + 命中统计
+    - 未命中时同一键只加载一次，并发的相同请求等待同一结果
+    - 加载失败不缓存，异常传递给所有等待方；加载函数抛出 UncacheableResult 时返回其结果但不缓存
+    - 传入共享存储时作为第二级缓存（值须可 JSON 序列化、键为字符串），
+      其他 worker 加载的结果同样可以命中
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_bytes: int,
+        sizeof: Callable[[Any], int],
+        store: Optional[SharedStore] = None,
+        namespace: str = ""
+    ):
+        self.ttl = ttl
+        self.entries = TTLCache(ttl=ttl, max_bytes=max_bytes)
+        self.flight = SingleFlight()
+        self.sizeof = sizeof
+        self.store = store
+        self.namespace = namespace
+        self._stats = {"hits": 0, "shared_hits": 0, "misses": 0, "coalesced": 0}
+
+    def peek(self, key: Hashable) -> Optional[Any]:
+        """只查缓存，不触发加载"""
+        value = self.entries.get(key)
+        if value is None and self.store is not None:
+            value = self._load_shared(key)
+        return value
+
+    def _load_shared(self, key: Hashable) -> Optional[Any]:
+        """从共享存储读取，命中时写回本进程缓存"""
+        value = self.store.get(self.namespace, key)
+        if value is not None:
+            self.entries.set(key, value, self.sizeof(value))
+        return value
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, str]:
+        """返回 (结果, 命中状态)，命中状态为 HIT / SHARED（共享存储命中）/ MISS / COALESCED"""
+        value = self.entries.get(key)
+        if value is not None:
+            self._stats["hits"] += 1
+            return value, "HIT"
+
+        if self.store is not None:
+            value = self._load_shared(key)
+            if value is not None:
+                self._stats["shared_hits"] += 1
+                return value, "SHARED"
+
+        value, shared = await self.flight.do(key, lambda: self._load_and_store(key, load))
+        if shared:
+            self._stats["coalesced"] += 1
+            return value, "COALESCED"
+        self._stats["misses"] += 1
+        return value, "MISS"
+
+    async def prefetch(
+        self,
+        key: Hashable,
+        load: Callable[[], Awaitable[Any]],
+        admit: Optional[Callable[[], bool]] = None
+    ) -> bool:
+        """
+        后台预取：已缓存或正在加载时跳过，不计入命中统计
+        admit 在确认需要加载后、开始加载前调用（如扣减预取配额），返回 False 时放弃
+        预取期间到达的相同请求会合并到这次加载；返回是否实际加载
+        """
+        if self.peek(key) is not None or key in self.flight:
+            return False
+        if admit is not None and not admit():
+            return False
+        await self.flight.do(key, lambda: self._load_and_store(key, load))
+        return True
+
+    async def _load_and_store(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            result = await load()
+        except UncacheableResult as e:
+            return e.value
+        self.entries.set(key, result, self.sizeof(result))
+        if self.store is not None:
+            self.store.set(self.namespace, key, result, self.ttl)
+        return result
+
+    def stats(self) -> dict:
+        lookups = sum(self._stats.values())
+        return {
+            **self._stats,
+            "hit_ratio": round(
+                (self._stats["hits"] + self._stats["shared_hits"] + self._stats["coalesced"]) / lookups, 4
+            ) if lookups else 0.0,
+            "entries": len(self.entries),
+            "bytes": self.entries.current_bytes,
+            "in_flight": len(self.flight),
+            "shared": self.store is not None,
+        }
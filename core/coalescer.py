@@ -0,0 +1,95 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from core.models import QAPair
+
+# 一条待合并的增量更新：(版本号, 问答列表)
+PendingUpdate = Tuple[Optional[int], List[QAPair]]
+
+
+@dataclass
+class _PendingBatch:
+    updates: List[PendingUpdate] = field(default_factory=list)
+    waiters: List[asyncio.Future] = field(default_factory=list)
+    timer: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def pair_count(self) -> int:
+        return sum(len(pairs) for _, pairs in self.updates)
+
+
+class QACoalescer:
+    """
+    增量问答合并器
+    - 同一键（案件+报警人）在窗口期内到达的问答合并为一批，只调用一次 flush
+    - 批内问答数达到上限时立即执行，不再等待窗口结束
+    - 批内所有等待方得到同一个结果（或同一个异常）
+    """
+
+    def __init__(self, window: float, max_pairs: int):
+        self.window = window
+        self.max_pairs = max_pairs
+        self._pending: Dict[Hashable, _PendingBatch] = {}
+        # 执行中的批次任务（保留引用，避免被垃圾回收）
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {"requests": 0, "batches": 0}
+
+    async def submit(
+        self,
+        key: Hashable,
+        update: PendingUpdate,
+        flush: Callable[[List[PendingUpdate]], Awaitable[Any]]
+    ) -> Any:
+        """加入当前批次并等待该批次的执行结果"""
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _PendingBatch()
+            self._pending[key] = batch
+            batch.timer = loop.call_later(
+                self.window, self._start_flush, key, batch, flush)
+
+        waiter = loop.create_future()
+        batch.updates.append(update)
+        batch.waiters.append(waiter)
+        self._stats["requests"] += 1
+
+        if batch.pair_count >= self.max_pairs:
+            batch.timer.cancel()
+            self._start_flush(key, batch, flush)
+
+        # 等待方被取消不影响批次执行
+        return await asyncio.shield(waiter)
+
+    def _start_flush(self, key: Hashable, batch: _PendingBatch, flush):
+        # 从待合并表中移除，之后到达的问答进入新批次
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        self._stats["batches"] += 1
+        task = asyncio.ensure_future(self._run(batch, flush))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: _PendingBatch, flush):
+        try:
+            result = await flush(batch.updates)
+        except BaseException as e:
+            # 批次任务被取消（如应用关闭）时同样通知所有等待方，避免请求一直挂起
+            error = e if isinstance(e, Exception) else asyncio.CancelledError()
+            for waiter in batch.waiters:
+                if not waiter.done():
+                    waiter.set_exception(error)
+            if not isinstance(e, Exception):
+                raise
+            return
+        for waiter in batch.waiters:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "window_ms": int(self.window * 1000),
+        }
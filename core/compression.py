@@ -0,0 +1,82 @@
+import gzip
+import zlib
+from typing import Optional, Set
+
+from config.settings import settings
+
+"""
+代理响应压缩
+- 上游已压缩（gzip / deflate）且浏览器接受该编码时原样转发，不解压再压缩
+- 浏览器不接受时才解压
+- 上游未压缩的文本资源（JS、CSS 等）在转发时压缩，缓存中保存压缩后的内容
+"""
+
+# 可原样转发及可解压的编码
+SUPPORTED_ENCODINGS = {"gzip", "deflate"}
+
+# 值得压缩的内容类型（图片瓦片等本身已压缩的格式不再压缩）
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/x-javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """解析请求头 Accept-Encoding，返回浏览器接受的编码（忽略 q=0）"""
+    encodings = set()
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip()
+        if not name:
+            continue
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        encodings.add(name)
+    if "*" in encodings:
+        encodings |= SUPPORTED_ENCODINGS
+    return encodings
+
+
+def is_compressible(content_type: str, size: Optional[int] = None) -> bool:
+    """文本类资源且大小未知或不小于 PROXY_GZIP_MIN_BYTES 时压缩"""
+    content_type = content_type.lower()
+    if not any(content_type.startswith(t) for t in COMPRESSIBLE_TYPES):
+        return False
+    return size is None or size >= settings.PROXY_GZIP_MIN_BYTES
+
+
+def gzip_body(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=settings.PROXY_GZIP_LEVEL)
+
+
+def decode_body(body: bytes, encoding: str) -> bytes:
+    """解压 gzip / deflate 内容（deflate 兼容带 zlib 头与不带头两种格式）"""
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    try:
+        return zlib.decompress(body)
+    except zlib.error:
+        return zlib.decompress(body, -zlib.MAX_WBITS)
+
+
+class GzipEncoder:
+    """流式 gzip 压缩：每块输出后同步刷新，浏览器可边收边解压"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(
+            settings.PROXY_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, chunk: bytes) -> bytes:
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH)
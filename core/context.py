@@ -0,0 +1,228 @@
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+from core.models import QA, QAPair
+from core.tokens import estimate_messages_tokens, estimate_tokens
+
+# 视为空回答的内容
+EMPTY_ANSWERS = {"", "无", "没有", "-", "/", "null", "none", "n/a"}
+# 超出预算时单个回答保留的最大字符数
+MAX_ANSWER_CHARS = 200
+# 重复回答判定：达到该长度的相同回答视为重复（过短的“是”“否”不算）
+DUPLICATE_MIN_CHARS = 10
+CONTEXT_OMITTED_MARK = "……（已省略较早的背景信息）"
+# 最后的强制截断中单个回答至少保留的字符数
+MIN_ANSWER_CHARS = 20
+
+
+def model_context_budget(model: str) -> int:
+    """模型上下文预算（输入 + 输出 token），LLM_MODEL_BUDGETS 中未配置的模型使用默认值"""
+    budgets: Dict[str, int] = {}
+    for item in settings.LLM_MODEL_BUDGETS:
+        name, _, value = item.partition(":")
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets.get(model, settings.LLM_CONTEXT_BUDGET)
+
+
+@dataclass
+class BudgetReport:
+    """单次请求的 token 预算使用情况"""
+    model: str
+    input_budget: int
+    output_budget: int
+    original_input_tokens: int = 0
+    input_tokens: int = 0
+    output_tokens: Optional[int] = None
+    actions: List[str] = field(default_factory=list)
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.actions)
+
+    def summary(self) -> str:
+        output = f"{self.output_tokens}/{self.output_budget}" if self.output_tokens is not None else f"-/{self.output_budget}"
+        text = f"token预算 模型={self.model} 输入={self.input_tokens}/{self.input_budget} 输出={output}"
+        if self.trimmed:
+            text += f" 裁剪前输入={self.original_input_tokens} 裁剪={','.join(self.actions)}"
+        return text
+
+
+class ContextBudget:
+    """
+    上下文预算管理
+    - 本地估算 token（不访问网络），使系统提示词 + 用户消息不超过模型输入预算
+    - 超出预算时按价值从低到高依次裁剪：空回答 → 重复回答 → 较早的背景信息 → 过长回答 → 最早的问答
+      → 强制截断最长的回答；仍无法满足预算时记录告警
+    - 按完整的消息列表（系统提示词 + 用户消息，含消息格式开销）计算 token
+    """
+
+    def __init__(self, model: str, max_tokens: int):
+        self.model = model
+        self.output_budget = max_tokens
+        self.input_budget = max(model_context_budget(model) - max_tokens, 0)
+
+    def fit(
+        self,
+        system_prompt: str,
+        qa_list: List[QA],
+        case_context: Optional[str],
+        render: Callable[[List[QA], Optional[str]], str],
+        compress_context: bool = True
+    ) -> Tuple[str, BudgetReport]:
+        """返回 (预算内的用户消息, 预算报告)；compress_context=False 时背景信息原样保留（如增量摘要 JSON）"""
+        report = BudgetReport(self.model, self.input_budget, self.output_budget)
+
+        def measure(qa_list, case_context) -> Tuple[str, int]:
+            message = render(qa_list, case_context)
+            return message, estimate_messages_tokens([
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message},
+            ])
+
+        message, tokens = measure(qa_list, case_context)
+        report.original_input_tokens = tokens
+
+        steps = [
+            ("空回答", lambda q, c: (_drop_empty_answers(q), c)),
+            ("重复回答", lambda q, c: (_drop_duplicate_answers(q), c)),
+        ]
+        if compress_context:
+            steps.append(("背景信息", lambda q, c: self._compress_context(q, c, measure)))
+        steps.append(("过长回答", lambda q, c: (_truncate_answers(q), c)))
+
+        for name, step in steps:
+            if tokens <= self.input_budget:
+                break
+            new_qa, new_context = step(qa_list, case_context)
+            new_message, new_tokens = measure(new_qa, new_context)
+            if new_tokens < tokens:
+                qa_list, case_context = new_qa, new_context
+                message, tokens = new_message, new_tokens
+                report.actions.append(name)
+
+        # 仍超出预算：从问答最多的报警人开始丢弃最早的问答（每人至少保留最后一条）
+        dropped = 0
+        while tokens > self.input_budget:
+            remaining = _drop_oldest_pair(qa_list)
+            if remaining is None:
+                break
+            qa_list = remaining
+            dropped += 1
+            message, tokens = measure(qa_list, case_context)
+        if dropped:
+            report.actions.append(f"最早问答x{dropped}")
+
+        # 每人只剩一条问答仍超出预算（如单个报警人的回答过长）：逐次减半最长的回答
+        truncated = 0
+        while tokens > self.input_budget:
+            shortened = _halve_longest_answer(qa_list)
+            if shortened is None:
+                break
+            qa_list = shortened
+            truncated += 1
+            message, tokens = measure(qa_list, case_context)
+        if truncated:
+            report.actions.append(f"强制截断x{truncated}")
+
+        if tokens > self.input_budget:
+            logger.warning(
+                f"输入超出 token 预算且无法继续裁剪: 模型={self.model} 输入={tokens}/{self.input_budget}")
+        report.input_tokens = tokens
+        return message, report
+
+    def _compress_context(
+        self,
+        qa_list: List[QA],
+        case_context: Optional[str],
+        measure: Callable[[List[QA], Optional[str]], Tuple[str, int]]
+    ):
+        """
+        背景信息只保留最近的部分（末尾）
+        按不含背景信息时完整消息列表的 token 数计算剩余预算，最多压缩到输入预算的四分之一
+        """
+        if not case_context:
+            return qa_list, case_context
+        _, base_tokens = measure(qa_list, None)
+        limit = max(self.input_budget - base_tokens, self.input_budget // 4)
+        if estimate_tokens(case_context) <= limit:
+            return qa_list, case_context
+        kept = case_context
+        while kept and estimate_tokens(kept) > limit:
+            kept = kept[max(1, len(kept) // 4):]
+        return qa_list, CONTEXT_OMITTED_MARK + kept
+
+
+def _copy_qa(qa: QA, pairs: List[QAPair]) -> QA:
+    return QA(caller_id=qa.caller_id, qa_pairs=pairs)
+
+
+def _drop_empty_answers(qa_list: List[QA]) -> List[QA]:
+    return [
+        _copy_qa(qa, [p for p in qa.qa_pairs if p.answer.strip().lower() not in EMPTY_ANSWERS])
+        for qa in qa_list
+    ]
+
+
+def _drop_duplicate_answers(qa_list: List[QA]) -> List[QA]:
+    """同一报警人重复的问答（或较长的相同回答）只保留第一次出现"""
+    result = []
+    for qa in qa_list:
+        seen_pairs, seen_answers, pairs = set(), set(), []
+        for p in qa.qa_pairs:
+            answer = p.answer.strip()
+            pair_key = (p.question.strip(), answer)
+            if pair_key in seen_pairs or (len(answer) >= DUPLICATE_MIN_CHARS and answer in seen_answers):
+                continue
+            seen_pairs.add(pair_key)
+            seen_answers.add(answer)
+            pairs.append(p)
+        result.append(_copy_qa(qa, pairs))
+    return result
+
+
+def _truncate_answers(qa_list: List[QA]) -> List[QA]:
+    return [
+        _copy_qa(qa, [
+            QAPair(question=p.question, answer=p.answer[:MAX_ANSWER_CHARS] + "……")
+            if len(p.answer) > MAX_ANSWER_CHARS else p
+            for p in qa.qa_pairs
+        ])
+        for qa in qa_list
+    ]
+
+
+def _halve_longest_answer(qa_list: List[QA]) -> Optional[List[QA]]:
+    """把最长的回答截为一半；截后将短于 MIN_ANSWER_CHARS 时返回 None"""
+    longest = None
+    for i, qa in enumerate(qa_list):
+        for j, p in enumerate(qa.qa_pairs):
+            if longest is None or len(p.answer) > len(qa_list[longest[0]].qa_pairs[longest[1]].answer):
+                longest = (i, j)
+    if longest is None:
+        return None
+    i, j = longest
+    pair = qa_list[i].qa_pairs[j]
+    keep = len(pair.answer) // 2
+    if keep < MIN_ANSWER_CHARS:
+        return None
+    pairs = list(qa_list[i].qa_pairs)
+    pairs[j] = QAPair(question=pair.question, answer=pair.answer[:keep] + "……")
+    result = list(qa_list)
+    result[i] = _copy_qa(qa_list[i], pairs)
+    return result
+
+
+def _drop_oldest_pair(qa_list: List[QA]) -> Optional[List[QA]]:
+    """丢弃问答最多的报警人最早的一条问答；每人都只剩一条时返回 None"""
+    longest = max(range(len(qa_list)),
+                  key=lambda i: len(qa_list[i].qa_pairs), default=None)
+    if longest is None or len(qa_list[longest].qa_pairs) <= 1:
+        return None
+    result = list(qa_list)
+    result[longest] = _copy_qa(
+        qa_list[longest], qa_list[longest].qa_pairs[1:])
+    return result
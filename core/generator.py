@@ -1,20 +1,61 @@
-from openai import OpenAI, AsyncOpenAI  # 显式使用新版客户端
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional, Tuple
 from config.settings import settings
 from loguru import logger
+from config.logging_conf import payload_digest, sample_payload
 from core.models import SummaryResponse, SummaryRequest, QAPair, QA
+from core.prompts import PromptTemplateRegistry
+from core.result_cache import CallerSummaryCache, caller_summary_key
+from core.context import BudgetReport, ContextBudget
+from core.json_repair import dump_summary, parse_summary
+from core.llm_router import LLMRouter
+from core.scheduler import LLMScheduler, SchedulerOverloaded, SlotLease
+from core.shared_store import SharedStore
+from core.tokens import estimate_tokens
+from core import metrics
+from core.tracing import end_span, set_attr, span, start_span
+import asyncio
+import json
+import time
+
+
+def build_total_info(callers: List[dict]) -> str:
+    """根据各报警人身份在本地汇总 total_info，如：（共3人报警，1轻生者+2住户）"""
+    counts = {}
+    for caller in callers:
+        identity = caller.get("identity") or "报警人"
+        counts[identity] = counts.get(identity, 0) + 1
+    distribution = "+".join(f"{n}{identity}" for identity, n in counts.items())
+    return f"（共{len(callers)}人报警，{distribution}）"
 
 
 class EmergencySummaryGenerator:
-    def __init__(self):
-        # 使用 AsyncOpenAI 异步客户端
-        self.client = AsyncOpenAI(
-            api_key=settings.API_KEY,
-            base_url=settings.BASE_URL
-        )
-        self.model = settings.LLM_MODEL
+    def __init__(
+        self,
+        router: Optional[LLMRouter] = None,
+        prompts: Optional[PromptTemplateRegistry] = None,
+        scheduler: Optional[LLMScheduler] = None,
+        store: Optional[SharedStore] = None
+    ):
+        # 多后端路由（各后端 AsyncOpenAI 客户端）；由应用生命周期统一创建并共享连接池
+        self.router = router or LLMRouter()
+        # 大模型调用准入与优先级调度（全局并发上限）
+        self.scheduler = scheduler or LLMScheduler(store=store)
+        # 提示词模板在启动时构建一次
+        self.prompts = prompts or PromptTemplateRegistry()
+        # 分治总结中单个报警人的结果缓存（可经共享存储在 worker 间共享）
+        self.caller_cache = CallerSummaryCache(store) if settings.MAP_REDUCE_MIN_CALLERS > 0 else None
+        # 缓存键与上下文预算以首个后端的模型为准
+        self.model = self.router.primary.model
         self.temperature = 0.3
-        self.max_tokens = 512
+        self.max_tokens = settings.LLM_MAX_TOKENS
+        # 按模型上下文预算裁剪输入
+        self.budget = ContextBudget(self.model, self.max_tokens)
+        # 结构化输出各解析路径计数：直接解析 / 本地修复 / 重新请求 / 最终失败
+        self.output_stats = {"direct": 0, "repaired": 0, "retried": 0, "failed": 0}
+
+    async def aclose(self):
+        """关闭各后端客户端，释放连接池"""
+        await self.router.aclose()
 
     async def generate_summary(
         self,
@@ -22,128 +63,168 @@ class EmergencySummaryGenerator:
     ) -> SummaryResponse:
         """生成接警指引总结"""
         try:
-            # 1. 构建提示词
-            system_prompt = self._build_system_prompt(
-                request_data.guidance_type,
-                request_data.summary_type,
-                request_data.prompt
-            )
-
-            # 2. 构建用户消息：整合所有 QA 数据
-            user_message = self._build_user_message(
-                request_data.qa_list,
-                request_data.case_context
-            )
+            # 报警人较多时分治：逐人并行总结后归并，耗时取决于最长的单个报警人
+            if self._use_map_reduce(request_data):
+                try:
+                    summary, valid = await self._generate_map_reduce(request_data)
+                    return SummaryResponse(
+                        case_id=request_data.case_id,
+                        summary=summary,
+                        guidance_type=request_data.guidance_type,
+                        valid=valid
+                    )
+                except (ValueError, KeyError, IndexError, TypeError) as e:
+                    logger.warning(f"分治总结结果解析失败，改为整体生成, 案件ID={request_data.case_id}: {e}")
+
+            # 1-2. 构建提示词与用户消息
+            system_prompt, user_message, report = self._build_messages(
+                request_data)
 
             # 3. 调用大模型
-            logger.debug(
-                f"生成总结,案件ID= {request_data.case_id},问答记录={user_message}")
-            logger.debug(f"系统提示词: {system_prompt}")
-            response_text = await self._call_llm(system_prompt, user_message)
+            self._log_payload("生成总结", request_data.case_id,
+                              system_prompt, user_message)
+            response_text, valid = await self._call_llm_structured(
+                system_prompt, user_message, report, str(request_data.summary_type))
 
             # 4. 构建响应
             return SummaryResponse(
                 case_id=request_data.case_id,
                 summary=response_text,
-                guidance_type=request_data.guidance_type
-
+                guidance_type=request_data.guidance_type,
+                valid=valid
             )
 
+        except SchedulerOverloaded:
+            raise
         except Exception as e:
             logger.error(f"生成指引总结失败: {str(e)}", exc_info=True)
             raise
 
-    def _build_system_prompt(self, guidance_type: str, summary_type: str, prompt: str) -> str:
-        role_desc = "主报警人" if summary_type == 2 else "其他报警人"
-        base_instruction = f"你是一名专业的消防救援指挥中心接警信息归纳员，需要根据接警员和{role_desc}提供的对话信息生成{guidance_type}接警指引总结。请按照以下要求提取信息：{prompt}"
-
-        # 对当前 报警人进行总结
-        if summary_type == 2:
-            # 主报警人 → callers 只有一个对象，total_info 简化
-            format_instruction = f"""
-        请严格按照以下 JSON 格式输出，不要包含任何额外文本、分析、编号或标题：
-
-        {{
-            "total_info": "（共1人报警，[具体身份]）",
-            "callers": [
-                {{
-                    "identity": "具体身份，如：轻生者、住户、路人等",
-                    "phone": "电话号码",
-                    "summary": "简洁的一句话总结，完全基于对话信息",
-                    "isTrapped": true 或 false  // 若对话中明确表明报警人本人被困（如“我被困在…”、“我出不去了”、“是本人被困”等），则为 true；否则为 false
-
-                }}
-            ]
-        }}
-
-        请确保：
-        - total_info 必须是“（共1人报警，[具体身份]）”格式，例如：“（共1人报警，轻生者）”
-        - callers 列表中只包含一个对象，包含 identity、phone、summary 三个字段
-        - identity 描述要具体：轻生者、报警人、知情人、住户、租客、路人、目击者、家属、朋友等
-        - summary 必须是一句话，不要分点、不要换行、不要添加分析
-        - isTrapped 必须是布尔值 true 或 false，根据对话内容判断：若报警人明确表示自己被困（如“我被困在1503”、“我在屋里出不去”、“是本人被困”），则为 true；若未提及或仅描述他人被困，则为 false
-        - 输出必须是合法 JSON，可以直接被程序解析
-        - 不要包含 ```json 或任何 Markdown 包装
+    @staticmethod
+    def _log_payload(action: str, case_id: str, system_prompt: str, user_message: str):
         """
-        elif summary_type == 3:
-            # 总结全部报警人 → callers 只有一个对象，仅含 summary 字段，但采用“总分结构”
-            format_instruction = f"""
-        请严格按照以下 JSON 格式输出，不要包含任何额外文本、分析、编号或标题：
-
-        {{
-            "total_info": "（共X人报警，[角色分布统计，如：1轻生者+2住户+1路人]）",
-            "callers": [
-                {{
-                    "summary": "各报警人共同反馈[共性内容一句话]。具体而言：[身份A]（[电话A]）描述：[个性化一句话]\\n[身份B]（[电话B]）描述：[个性化一句话]\\n..."
-                }}
-            ]
-        }}
-
-        请确保：
-        - total_info 必须以“（共X人报警，...）”开头，角色分布按实际汇总（如：1轻生者+2住户）
-        - callers 列表中只包含一个对象，且只包含 summary 字段
-        - summary 字段内容必须为一个字符串，采用“总分结构”：
-          1. 开头必须是“各报警人共同反馈[共性内容一句话]。” —— 提炼所有报警人提及的共同情况（如：浓烟、断电、位置、危险类型等）
-          2. 紧接着是“具体而言：”，然后逐条列出每位报警人的个性化信息，格式为：
-             “[身份]（[电话]）描述：[一句话总结]\\n”
-          3. 每条报警人信息后必须使用 \\n 换行，最后一条也需换行（保持格式统一）
-        - 示例：
-          "各报警人共同反馈楼道浓烟弥漫且存在断电情况。具体而言：住户A（17633607832）描述：配电间起火及1503室两名老人被困\\n路人B（16696380123）描述：发现1601室厨房明火\\n14楼住户C（12038474728）描述：电梯井火花及不明位置呼救声\\n"
-        - 共性内容必须基于对话中多个报警人交叉验证的信息，若无明确共性，可写“各报警人未反馈明显共同情况。”
-        - 每个报警人的描述必须简洁、独立成句、不换行、不分析
-        - 输出必须是合法 JSON，可以直接被程序解析
-        - 不要包含 ```json 或任何 Markdown 包装
+        调试日志：提示词与问答只记录长度和哈希，且仅在 DEBUG 级别开启时才计算（lazy）
+        LOG_PAYLOAD_SAMPLE_RATE > 0 时按比例抽样输出完整内容
         """
+        logger.opt(lazy=True).debug(
+            "{}, 案件ID={}, 系统提示词[{}], 用户消息[{}]",
+            lambda: action, lambda: case_id,
+            lambda: payload_digest(system_prompt), lambda: payload_digest(user_message))
+        if sample_payload():
+            logger.opt(lazy=True).debug(
+                "{}（抽样完整内容）, 案件ID={}\n系统提示词: {}\n用户消息: {}",
+                lambda: action, lambda: case_id, lambda: system_prompt, lambda: user_message)
+
+    def _use_map_reduce(self, request_data: SummaryRequest) -> bool:
+        return (
+            request_data.summary_type in (1, 3)
+            and settings.MAP_REDUCE_MIN_CALLERS > 0
+            and len(request_data.qa_list) >= settings.MAP_REDUCE_MIN_CALLERS
+        )
+
+    async def _generate_map_reduce(self, request_data: SummaryRequest) -> Tuple[str, bool]:
+        """
+        多报警人分治总结，返回 (总结, 是否通过结构校验)
+        - map：每个报警人按单人格式并行总结，结果按该报警人的问答缓存
+        - reduce：summary_type=1 在本地汇总 total_info 与 callers；summary_type=3 基于各人摘要做一次简短归并
+        """
+        with span("summary.map", callers=len(request_data.qa_list)):
+            callers = await asyncio.gather(*(
+                self._summarize_caller(request_data, qa) for qa in request_data.qa_list
+            ))
+        logger.debug("分治总结完成 map 阶段, 案件ID={}, 报警人数={}",
+                     request_data.case_id, len(callers))
+
+        if request_data.summary_type == 3:
+            return await self._call_llm_structured(
+                self._build_system_prompt(
+                    request_data.guidance_type, 3, request_data.prompt),
+                self._build_reduce_message(callers),
+                summary_type="3"
+            )
+
+        return json.dumps({
+            "total_info": build_total_info(callers),
+            "callers": callers
+        }, ensure_ascii=False), True
+
+    async def _summarize_caller(self, request_data: SummaryRequest, qa: QA) -> dict:
+        """map 阶段：单个报警人总结，返回 callers 中的单个对象"""
+        async def load() -> dict:
+            system_prompt = self._build_system_prompt(
+                request_data.guidance_type, 2, request_data.prompt)
+            user_message, report = self.budget.fit(
+                system_prompt, [qa], request_data.case_context, self._build_user_message)
+            response_text, _ = await self._call_llm_structured(
+                system_prompt, user_message, report, "2")
+            caller = json.loads(response_text)["callers"][0]
+            if not isinstance(caller, dict):
+                raise TypeError("callers 元素不是对象")
+            return caller
+
+        if self.caller_cache is None:
+            return await load()
+        key = caller_summary_key(
+            request_data, qa, self.model, self.temperature)
+        caller, _ = await self.caller_cache.get_or_load(key, load)
+        return caller
+
+    def _build_reduce_message(self, callers: List[dict]) -> str:
+        """reduce 阶段用户消息：各报警人的摘要（代替原始问答）"""
+        lines = ["【各报警人摘要】"]
+        for idx, caller in enumerate(callers):
+            lines.append(
+                f"报警人 {idx+1}：身份={caller.get('identity', '')}，电话={caller.get('phone', '')}，"
+                f"是否本人被困={caller.get('isTrapped', False)}，描述={caller.get('summary', '')}")
+        return "\n".join(lines)
+
+    def _build_messages(self, request_data: SummaryRequest) -> Tuple[str, str, BudgetReport]:
+        """构建完整总结的系统提示词与用户消息（按 token 预算裁剪），并返回预算报告"""
+        with span("prompt.build") as s:
+            # 1. 构建提示词
+            system_prompt = self._build_system_prompt(
+                request_data.guidance_type,
+                request_data.summary_type,
+                request_data.prompt
+            )
+
+            # 2. 构建用户消息：整合所有 QA 数据，超出预算时按优先级裁剪
+            user_message, report = self.budget.fit(
+                system_prompt,
+                request_data.qa_list,
+                request_data.case_context,
+                self._build_user_message
+            )
+            set_attr(s, "input_tokens", report.input_tokens)
+        return system_prompt, user_message, report
+
+    async def stream_summary(
+        self,
+        request_data: SummaryRequest,
+        incremental: bool = False,
+        lease: Optional[SlotLease] = None
+    ) -> AsyncIterator[str]:
+        """流式生成总结：逐段产出大模型输出的文本片段；传入 lease 时使用调用方已获取的调用名额"""
+        if incremental:
+            system_prompt, user_message, report = self._build_incremental_messages(
+                request_data)
         else:
-            # 其他报警人总结
-            format_instruction = f"""
-            请严格按照以下 JSON 格式输出，不要包含任何额外文本、分析、编号或标题：
-
-            {{
-                "total_info": "（共X人报警，[角色分布统计，如：1轻生者+2住户+1路人]）",
-                "callers": [
-                    {{
-                        "identity": "具体身份，如：路人、住户、轻生者等",
-                        "phone": "电话号码",
-                        "summary": "简洁的一句话总结，完全基于对话信息",
-                        "isTrapped": true 或 false  // 若对话中明确表明报警人本人被困（如“我被困在…”、“我出不去了”、“是本人被困”等），则为 true；否则为 false
-
-                    }},
-                    ...
-                ]
-            }}
-
-            请确保：
-            - total_info 必须以“（共X人报警，...）”开头，角色分布按实际汇总（如：1轻生者+2住户）
-            - callers 是一个列表，每个元素是一个对象，包含 identity、phone、summary 三个字段
-            - identity 描述要具体：轻生者、报警人、知情人、住户、租客、路人、目击者、家属、朋友等
-            - summary 必须是一句话，不要分点、不要换行、不要添加分析
-            - isTrapped 必须是布尔值 true 或 false，根据对话内容判断：若报警人明确表示自己被困（如“我被困在1503”、“我在屋里出不去”、“是本人被困”），则为 true；若未提及或仅描述他人被困，则为 false
-            - 输出必须是合法 JSON，可以直接被程序解析
-            - 不要包含 ```json 或任何 Markdown 包装
-            """
-
-        return base_instruction + format_instruction
+            system_prompt, user_message, report = self._build_messages(
+                request_data)
+
+        logger.debug("流式生成总结, 案件ID={}", request_data.case_id)
+        summary_type = "incremental" if incremental else str(request_data.summary_type)
+        # 外层生成器被关闭（客户端断开）时同步关闭内层生成器，及时结束 span 并归还调用名额
+        deltas = self._stream_llm(system_prompt, user_message, report, summary_type, lease)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+    def _build_system_prompt(self, guidance_type: str, summary_type: int, prompt: str) -> str:
+        """系统提示词由模板注册表构建并缓存（固定格式要求在前，可变内容在后）"""
+        return self.prompts.system_prompt(guidance_type, summary_type, prompt)
 
     def _build_user_message(self, qa_list: List[QA], case_context: Optional[str] = None) -> str:
         """构建指引信息"""
@@ -161,23 +242,168 @@ class EmergencySummaryGenerator:
 
         return "\n".join(lines)
 
-    async def _call_llm(self, system_prompt: str, user_message: str) -> str:
-        """调用大模型 API（OpenAI v1.x+ 异步方式）"""
+    async def _call_llm(
+        self,
+        system_prompt: str,
+        user_message: str,
+        report: Optional[BudgetReport] = None,
+        summary_type: str = "-"
+    ) -> str:
+        """调用大模型 API（OpenAI v1.x+ 异步方式），传入预算报告时记录输入输出 token 使用情况"""
         try:
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
-            return response.choices[0].message.content.strip()
+            async with self.scheduler.slot():
+                start = time.perf_counter()
+                response = await self.router.chat(
+                    hedge_slot=self.scheduler.try_acquire,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    **self._response_format()
+                )
+            elapsed = time.perf_counter() - start
+            content = response.choices[0].message.content.strip()
+            usage = response.usage
+            completion_tokens = usage.completion_tokens if usage else estimate_tokens(content)
+            prompt_tokens = usage.prompt_tokens if usage else \
+                report.input_tokens if report is not None else estimate_tokens(system_prompt + user_message)
+            self._observe_llm(summary_type, False, elapsed, elapsed, prompt_tokens, completion_tokens)
+            if report is not None:
+                report.output_tokens = completion_tokens
+                logger.info(report.summary())
+            return content
+        except SchedulerOverloaded:
+            raise
         except Exception as e:
             logger.error(f"大模型API调用失败: {str(e)}")
             raise
 
+    @staticmethod
+    def _observe_llm(
+        summary_type: str,
+        stream: bool,
+        elapsed: float,
+        first_token: float,
+        prompt_tokens: int,
+        completion_tokens: int
+    ):
+        """记录大模型调用耗时与 token 数指标"""
+        stream_label = "true" if stream else "false"
+        metrics.LLM_REQUEST_SECONDS.observe(elapsed, summary_type=summary_type, stream=stream_label)
+        metrics.LLM_TTFT_SECONDS.observe(first_token, summary_type=summary_type, stream=stream_label)
+        metrics.LLM_PROMPT_TOKENS.observe(prompt_tokens, summary_type=summary_type)
+        metrics.LLM_COMPLETION_TOKENS.observe(completion_tokens, summary_type=summary_type)
+
+    def _response_format(self) -> dict:
+        """开启 LLM_JSON_MODE 时要求大模型服务端约束输出为 JSON 对象（需服务端支持）"""
+        if settings.LLM_JSON_MODE:
+            return {"response_format": {"type": "json_object"}}
+        return {}
+
+    async def _call_llm_structured(
+        self,
+        system_prompt: str,
+        user_message: str,
+        report: Optional[BudgetReport] = None,
+        summary_type: str = "-"
+    ) -> Tuple[str, bool]:
+        """
+        调用大模型并校验输出结构，返回 (规范化的 JSON 字符串, 是否通过校验)
+        - 先直接解析，失败时在本地修复（代码块、注释、尾逗号、截断等）
+        - 本地修复仍失败才重新请求一次；再失败则原样返回大模型输出，并标记为未通过校验（不写入结果缓存）
+        """
+        response_text = await self._call_llm(system_prompt, user_message, report, summary_type)
+        try:
+            with span("output.parse"):
+                payload, path = parse_summary(response_text)
+        except ValueError as e:
+            logger.warning(f"总结输出无法解析，重新请求大模型: {e}")
+            self.output_stats["retried"] += 1
+            response_text = await self._call_llm(
+                system_prompt, user_message, summary_type=summary_type)
+            try:
+                payload, path = parse_summary(response_text)
+            except ValueError as e:
+                self.output_stats["failed"] += 1
+                logger.error(f"总结输出重新请求后仍无法解析: {e}")
+                return response_text, False
+        self.output_stats[path] += 1
+        if path == "repaired":
+            logger.info("总结输出经本地修复后解析成功")
+        return dump_summary(payload), True
+
+    def output_stats_report(self) -> dict:
+        """结构化输出解析统计（含各路径占比）"""
+        total = self.output_stats["direct"] + self.output_stats["repaired"] + self.output_stats["failed"]
+        stats = dict(self.output_stats)
+        stats["total"] = total
+        for name in ("direct", "repaired", "retried", "failed"):
+            stats[f"{name}_rate"] = round(self.output_stats[name] / total, 4) if total else 0.0
+        return stats
+
+    async def _stream_llm(
+        self,
+        system_prompt: str,
+        user_message: str,
+        report: Optional[BudgetReport] = None,
+        summary_type: str = "-",
+        lease: Optional[SlotLease] = None
+    ) -> AsyncIterator[str]:
+        """流式调用大模型 API（stream=True），逐段产出增量文本；整个流式输出期间占用一个调用名额"""
+        stream_span = None
+        error: Optional[BaseException] = None
+        try:
+            async with self.scheduler.slot(lease=lease):
+                stream_span = start_span("llm.stream", summary_type=summary_type)
+                start = time.perf_counter()
+                first_token = None
+                stream = await self.router.stream(
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_message}
+                    ],
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    **self._response_format()
+                )
+                set_attr(stream_span, "first_byte_ms", round((time.perf_counter() - start) * 1000, 3))
+                output_chars = []
+                async with stream:
+                    async for chunk in stream:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if first_token is None:
+                                first_token = time.perf_counter() - start
+                                set_attr(stream_span, "first_token_ms", round(first_token * 1000, 3))
+                            output_chars.append(delta)
+                            yield delta
+                elapsed = time.perf_counter() - start
+            completion_tokens = estimate_tokens("".join(output_chars))
+            prompt_tokens = report.input_tokens if report is not None else \
+                estimate_tokens(system_prompt + user_message)
+            self._observe_llm(summary_type, True, elapsed,
+                              first_token if first_token is not None else elapsed,
+                              prompt_tokens, completion_tokens)
+            if report is not None:
+                report.output_tokens = completion_tokens
+                logger.info(report.summary())
+        except SchedulerOverloaded:
+            raise
+        except Exception as e:
+            error = e
+            logger.error(f"大模型流式API调用失败: {str(e)}")
+            raise
+        except BaseException as e:
+            # 客户端断开（GeneratorExit）或请求被取消
+            error = e
+            raise
+        finally:
+            end_span(stream_span, error)
+
     # 增量式总结 当前报警人
     # summary_type=2 格式
 
@@ -187,69 +413,53 @@ class EmergencySummaryGenerator:
     ) -> SummaryResponse:
         """生成增量式接警指引总结（summary_type=2 格式）"""
         try:
-            # 1. 构建系统提示词（专为增量设计）
-            system_prompt = self._build_incremental_system_prompt(
-                request_data.guidance_type,
-                request_data.prompt
-            )
-
-            # 2. 构建用户消息：历史摘要 + 新问答
-            user_message = self._build_incremental_user_message(
-                request_data.case_context,  # 历史摘要
-                request_data.qa_list[0]    # 当前问答（只有一个）
-            )
+            # 1-2. 构建增量系统提示词与用户消息
+            system_prompt, user_message, report = self._build_incremental_messages(
+                request_data)
 
             # 3. 调用大模型
-            logger.debug(f"增量生成总结, 案件ID={request_data.case_id}")
-            logger.debug(f"系统提示词: {system_prompt}")
-            logger.debug(f"用户消息: {user_message}")
+            self._log_payload("增量生成总结", request_data.case_id,
+                              system_prompt, user_message)
 
-            response_text = await self._call_llm(system_prompt, user_message)
+            response_text, valid = await self._call_llm_structured(
+                system_prompt, user_message, report, "incremental")
 
             # 4. 返回响应
             return SummaryResponse(
                 case_id=request_data.case_id,
                 summary=response_text,
-                guidance_type=request_data.guidance_type
+                guidance_type=request_data.guidance_type,
+                valid=valid
             )
 
+        except SchedulerOverloaded:
+            raise
         except Exception as e:
             logger.error(f"增量生成指引总结失败: {str(e)}", exc_info=True)
             raise
 
+    def _build_incremental_messages(self, request_data: SummaryRequest) -> Tuple[str, str, BudgetReport]:
+        """构建增量总结的系统提示词与用户消息（按 token 预算裁剪新增问答，历史摘要原样保留）"""
+        # 1. 构建系统提示词（专为增量设计）
+        system_prompt = self._build_incremental_system_prompt(
+            request_data.guidance_type,
+            request_data.prompt
+        )
+
+        # 2. 构建用户消息：历史摘要 + 新问答
+        user_message, report = self.budget.fit(
+            system_prompt,
+            request_data.qa_list[:1],  # 当前问答（只有一个报警人）
+            request_data.case_context,  # 历史摘要
+            lambda qa_list, case_context: self._build_incremental_user_message(
+                case_context, qa_list[0]),
+            compress_context=False
+        )
+        return system_prompt, user_message, report
+
     def _build_incremental_system_prompt(self, guidance_type: str, prompt: str) -> str:
-        """构建增量更新专用系统提示词"""
-        return f"""
-    你是一个专业的消防救援接警信息归纳助手。现在需要你基于“已有报警人摘要”和“新增问答”，生成更新后的该报警人完整摘要。
-    请严格遵守以下规则：
-
-    - 输出格式必须与示例完全一致：一个 callers 数组，内含一个对象，包含 identity、phone、summary、isTrapped 四个字段
-    - total_info 必须是“（共1人报警，[具体身份]）”格式，身份需根据最新信息更新
-    - 如果历史摘要为空，你需从问答中根据用户自定义要求提取所有字段构建初始摘要
-    - 如果历史摘要存在：
-      - 保留未被新问答覆盖的字段（如已知电话，新问答没提，则保留）
-      - 用新问答信息更新对应字段（如新问答提到新电话，则替换；提到“我被困”，则 isTrapped=true）
-      - summary 字段需融合历史和新信息，生成一句更完整的话（不要分句、不要列表）
-    - isTrapped 判断规则：
-      - 若新增问答中报警人明确表示自己被困（如“我出不去了”、“我被困在阳台”），则为 true
-      - 若说“别人被困”或未提及，则保持原值或设为 false
-    - 输出必须是合法 JSON，无任何额外文本、分析、Markdown 包装
-    
-    用户自定义要求：{prompt}
-
-    输出格式示例：
-    {{
-        "total_info": "（共1人报警，住户）",
-        "callers": [
-            {{
-                "identity": "住户",
-                "phone": "13800138000",
-                "summary": "厨房起火，本人被困阳台，已通知物业",
-                "isTrapped": true
-            }}
-        ]
-    }}
-        """.strip()
+        """构建增量更新专用系统提示词（由模板注册表构建并缓存）"""
+        return self.prompts.incremental_system_prompt(guidance_type, prompt)
 
     def _build_incremental_user_message(self, current_summary: Optional[str], new_qa: QA) -> str:
         """构建增量用户消息"""
@@ -0,0 +1,161 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+from config.settings import settings
+from core.metrics import observe_upstream
+from core.tracing import end_span, span, start_span
+
+
+def _http2_available() -> bool:
+    """HTTP/2 依赖 h2 包，未安装时自动回退到 HTTP/1.1"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class BaiduHttpPool:
+    """
+    百度地图上游共享连接池
+    - 整个应用生命周期复用一个 httpx.AsyncClient，连接保持 keep-alive
+    - 按目标域名限制并发，避免单个域名占满连接池
+    - 记录每个域名的请求统计，便于调整连接池大小
+    """
+
+    def __init__(self):
+        self.http2 = settings.BAIDU_HTTP2 and _http2_available()
+        if settings.BAIDU_HTTP2 and not self.http2:
+            logger.warning("未安装 h2，百度代理连接池回退为 HTTP/1.1")
+
+        self.client = httpx.AsyncClient(
+            verify=False,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=settings.BAIDU_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.BAIDU_POOL_MAX_KEEPALIVE,
+                keepalive_expiry=settings.BAIDU_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(settings.BAIDU_READ_TIMEOUT,
+                                  connect=settings.BAIDU_CONNECT_TIMEOUT),
+        )
+        self.per_host_limit = settings.BAIDU_POOL_PER_HOST
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._host_stats: Dict[str, Dict[str, int]] = {}
+
+    def _host_entry(self, host: str):
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.Semaphore(
+                self.per_host_limit)
+            self._host_stats[host] = {
+                "requests": 0,
+                "errors": 0,
+                "in_flight": 0,
+                "waiting": 0,
+            }
+        return self._host_semaphores[host], self._host_stats[host]
+
+    @asynccontextmanager
+    async def limit(self, host: str):
+        """占用目标域名的一个并发名额，直到上下文退出"""
+        semaphore, stats = self._host_entry(host)
+        stats["waiting"] += 1
+        try:
+            if semaphore.locked():
+                with span("upstream.wait", host=host):
+                    await semaphore.acquire()
+            else:
+                await semaphore.acquire()
+        finally:
+            stats["waiting"] -= 1
+
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        try:
+            yield
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            semaphore.release()
+
+    async def get(self, url: str, timeout: Optional[float] = None, **kwargs) -> httpx.Response:
+        """按域名限流后发起 GET 请求（完整读取响应体）"""
+        host = urlsplit(url).hostname or ""
+        if timeout is not None:
+            kwargs["timeout"] = httpx.Timeout(
+                timeout, connect=settings.BAIDU_CONNECT_TIMEOUT)
+        async with self.limit(host):
+            start = time.perf_counter()
+            status = None
+            try:
+                with span("upstream.request", host=host):
+                    resp = await self.client.get(url, **kwargs)
+                status = resp.status_code
+                return resp
+            finally:
+                observe_upstream(host, time.perf_counter() - start, status)
+
+    @asynccontextmanager
+    async def stream(self, url: str, **kwargs):
+        """
+        流式 GET 请求：响应体不预先读取，由调用方逐块读取
+        域名并发名额和上游连接在上下文退出时一并释放
+        """
+        host = urlsplit(url).hostname or ""
+        async with self.limit(host):
+            start = time.perf_counter()
+            connected = False
+            connect_span = start_span("upstream.connect", host=host)
+            try:
+                async with self.client.stream("GET", url, **kwargs) as resp:
+                    # 耗时统计到收到响应头（响应体由调用方读取）
+                    connected = True
+                    end_span(connect_span)
+                    observe_upstream(host, time.perf_counter() - start, resp.status_code)
+                    yield resp
+            except httpx.HTTPError as e:
+                if not connected:
+                    end_span(connect_span, e)
+                    observe_upstream(host, time.perf_counter() - start, None)
+                raise
+
+    def host_stats(self) -> Dict[str, Dict[str, int]]:
+        """各域名请求情况（正在进行、等待名额的请求数等）的快照"""
+        return {host: dict(s) for host, s in self._host_stats.items()}
+
+    def stats(self) -> dict:
+        """连接池统计：当前连接数、空闲连接数、HTTP/2 连接数及各域名请求情况"""
+        connections = []
+        # httpcore 未公开连接池状态，这里尽量读取，读取失败不影响业务
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        for conn in getattr(pool, "connections", []) or []:
+            try:
+                connections.append({
+                    "idle": conn.is_idle(),
+                    "http2": "HTTP/2" in conn.info(),
+                })
+            except Exception:
+                continue
+
+        return {
+            "http2_enabled": self.http2,
+            "max_connections": settings.BAIDU_POOL_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.BAIDU_POOL_MAX_KEEPALIVE,
+            "per_host_limit": self.per_host_limit,
+            "connections": len(connections),
+            "idle_connections": sum(1 for c in connections if c["idle"]),
+            "http2_connections": sum(1 for c in connections if c["http2"]),
+            "hosts": self.host_stats(),
+        }
+
+    async def aclose(self):
+        """关闭连接池"""
+        await self.client.aclose()
@@ -0,0 +1,120 @@
+import json
+import re
+from typing import Tuple
+
+from pydantic import ValidationError
+
+from core.models import SummaryPayload
+
+_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+def _strip_comments(text: str) -> str:
+    """去掉字符串外的 // 与 /* */ 注释"""
+    out = []
+    i, n = 0, len(text)
+    in_string = False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 2
+                continue
+            if ch == '"':
+                in_string = False
+            i += 1
+            continue
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+            i += 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def _scan(text: str) -> Tuple[list, bool]:
+    """扫描 JSON 文本，返回 (尚未闭合的括号栈, 是否停在字符串内)"""
+    stack = []
+    in_string = False
+    escaped = False
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    return stack, in_string
+
+
+def _close_truncated(text: str) -> str:
+    """补全被截断的 JSON：闭合未结束的字符串，去掉不完整的键值对与空对象，补齐括号"""
+    _, in_string = _scan(text)
+    if in_string:
+        text += '"'
+    text = text.rstrip()
+    # 截断在键、冒号或未写完的 true/false/null 之后：去掉不完整的键值对
+    text = re.sub(r'\s*"[^"]*"\s*:\s*(?:t|tr|tru|f|fa|fal|fals|n|nu|nul)?$', "", text)
+    text = re.sub(r'([{,])\s*"[^"]*"\s*$', r"\1", text)
+    # 截断在刚开始的对象/数组处：去掉空壳
+    text = re.sub(r",\s*[{\[]\s*$", "", text.rstrip().rstrip(","))
+    stack, _ = _scan(text)
+    return text.rstrip().rstrip(",") + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """本地修复常见的大模型 JSON 输出问题：Markdown 代码块、前后多余文本、注释、尾逗号、截断"""
+    text = _FENCE_RE.sub("", text.strip())
+    start = text.find("{")
+    if start > 0:
+        text = text[start:]
+    text = _TRAILING_COMMA_RE.sub(r"\1", _strip_comments(text))
+    try:
+        # 只取第一个完整的 JSON 对象，忽略其后的多余文本
+        _, end = json.JSONDecoder().raw_decode(text)
+        return text[:end]
+    except ValueError:
+        pass
+    return _TRAILING_COMMA_RE.sub(r"\1", _close_truncated(text))
+
+
+def parse_summary(text: str) -> Tuple[SummaryPayload, str]:
+    """
+    解析大模型输出的总结
+    返回 (结构化结果, 解析路径)，路径为 direct（直接解析）或 repaired（本地修复后解析）
+    无法解析或不符合结构时抛出 ValueError
+    """
+    try:
+        return SummaryPayload.model_validate_json(text), "direct"
+    except ValidationError:
+        pass
+
+    repaired = repair_json(text)
+    try:
+        return SummaryPayload.model_validate_json(repaired), "repaired"
+    except ValidationError as e:
+        raise ValueError(f"总结结果不是合法 JSON 或结构不符: {e.errors()[0]['msg']}") from e
+
+
+def dump_summary(payload: SummaryPayload) -> str:
+    """序列化为紧凑的 JSON 字符串：只输出大模型给出的字段，显式的 null 原样保留（调用方依赖字段存在）"""
+    return payload.model_dump_json(exclude_unset=True)
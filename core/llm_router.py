@@ -0,0 +1,353 @@
+import asyncio
+import json
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable, Deque, List, Optional
+
+# httpx 无需延迟导入：百度连接池与启动预热在启动时同样需要，且导入耗时远小于 openai
+import httpx
+from loguru import logger
+
+from config.settings import settings
+from core.metrics import LLM_BACKEND_REQUESTS
+from core.tracing import span
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+    from core.scheduler import SlotLease
+
+# 延迟样本窗口（用于计算 p95 对冲延迟）
+LATENCY_WINDOW = 100
+# 计算 p95 所需的最少样本数，不足时使用配置的对冲延迟
+MIN_P95_SAMPLES = 20
+# 评分中错误率的惩罚系数
+ERROR_PENALTY = 4.0
+
+
+def create_llm_client(base_url: str, api_key: str, max_retries: int = 2) -> "AsyncOpenAI":
+    """创建带连接池的大模型异步客户端（连接复用，避免每次请求重新握手）"""
+    # openai 导入较慢（约占启动耗时一半），推迟到首次创建客户端时（通常在启动预热的后台线程中完成导入）
+    from openai import AsyncOpenAI
+    timeout = httpx.Timeout(settings.LLM_READ_TIMEOUT,
+                            connect=settings.LLM_CONNECT_TIMEOUT)
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=timeout,
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        timeout=timeout,
+        max_retries=max_retries,
+        http_client=http_client
+    )
+
+
+def is_backend_failure(error: Exception) -> bool:
+    """连接错误、超时、限流及 5xx 视为后端故障（计入熔断并切换后端）；其余如 400 为请求本身的问题"""
+    from openai import APIConnectionError, APIStatusError, APITimeoutError
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+@dataclass
+class LLMBackend:
+    """一个 OpenAI 兼容的大模型后端及其健康状态；客户端在首次使用时创建"""
+    name: str
+    model: str
+    base_url: str
+    api_key: str = field(repr=False)
+    max_retries: int = 2
+    _client: Optional["AsyncOpenAI"] = field(default=None, repr=False)
+    # 非流式调用完整耗时与错误率的指数移动平均（评分与对冲延迟只看完整耗时）
+    ewma_latency: Optional[float] = None
+    ewma_error: float = 0.0
+    latencies: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    # 流式调用建立流（首包）耗时，与完整耗时分开统计，只用于观察
+    ewma_ttfb: Optional[float] = None
+    ttfbs: Deque[float] = field(
+        default_factory=lambda: deque(maxlen=LATENCY_WINDOW))
+    inflight: int = 0
+    # 熔断状态：连续失败次数达到阈值后在 open_until 之前不再选中
+    consecutive_failures: int = 0
+    open_until: float = 0.0
+    requests: int = 0
+    failures: int = 0
+
+    @property
+    def client(self) -> "AsyncOpenAI":
+        if self._client is None:
+            self._client = create_llm_client(self.base_url, self.api_key, self.max_retries)
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self.open_until
+
+    def score(self) -> float:
+        """选择评分，越小越优先；尚无延迟样本的后端优先试探"""
+        if self.ewma_latency is None:
+            return 0.0
+        return self.ewma_latency * (1 + ERROR_PENALTY * self.ewma_error) * (1 + self.inflight * 0.1)
+
+    @staticmethod
+    def _p95(samples: Deque[float]) -> Optional[float]:
+        if len(samples) < MIN_P95_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+    def p95(self) -> Optional[float]:
+        return self._p95(self.latencies)
+
+    def record_success(self, latency: float, stream: bool = False):
+        """记录一次成功调用；流式调用的 latency 为首包耗时，计入单独的首包统计"""
+        alpha = settings.LLM_EWMA_ALPHA
+        if stream:
+            self.ewma_ttfb = latency if self.ewma_ttfb is None else \
+                alpha * latency + (1 - alpha) * self.ewma_ttfb
+            self.ttfbs.append(latency)
+        else:
+            self.ewma_latency = latency if self.ewma_latency is None else \
+                alpha * latency + (1 - alpha) * self.ewma_latency
+            self.latencies.append(latency)
+        self.ewma_error = (1 - alpha) * self.ewma_error
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record_cancelled(self, elapsed: float):
+        """
+        调用未完成即被取消（如对冲中落败）：真实耗时至少为 elapsed，作为下限样本计入延迟均值
+        否则总是落败的慢后端一直没有延迟样本，评分保持 0 而始终被优先选中
+        """
+        if self.ewma_latency is None or elapsed > self.ewma_latency:
+            alpha = settings.LLM_EWMA_ALPHA
+            self.ewma_latency = elapsed if self.ewma_latency is None else \
+                alpha * elapsed + (1 - alpha) * self.ewma_latency
+
+    def record_failure(self):
+        alpha = settings.LLM_EWMA_ALPHA
+        self.ewma_error = alpha + (1 - alpha) * self.ewma_error
+        self.failures += 1
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= settings.LLM_BREAKER_FAILURES:
+            # 熔断；冷却结束后放行请求试探（半开），再失败则重新熔断
+            self.open_until = time.monotonic() + settings.LLM_BREAKER_COOLDOWN
+            logger.warning(
+                f"大模型后端熔断: {self.name}, 连续失败={self.consecutive_failures}, "
+                f"冷却={settings.LLM_BREAKER_COOLDOWN}s")
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "model": self.model,
+            "available": self.available,
+            "ewma_latency_s": round(self.ewma_latency, 3) if self.ewma_latency is not None else None,
+            "ewma_error": round(self.ewma_error, 3),
+            "p95_s": round(self.p95(), 3) if self.p95() is not None else None,
+            "ewma_ttfb_s": round(self.ewma_ttfb, 3) if self.ewma_ttfb is not None else None,
+            "ttfb_p95_s": round(self._p95(self.ttfbs), 3) if self._p95(self.ttfbs) is not None else None,
+            "inflight": self.inflight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+def load_backends() -> List[LLMBackend]:
+    """
+    从 LLM_BACKENDS（JSON 列表）加载后端，每项包含 base_url、api_key、model，可选 name
+    未配置时使用 BASE_URL / API_KEY / LLM_MODEL 作为唯一后端
+    """
+    items = json.loads(settings.LLM_BACKENDS) if settings.LLM_BACKENDS.strip() else [{
+        "name": "default",
+        "base_url": settings.BASE_URL,
+        "api_key": settings.API_KEY,
+        "model": settings.LLM_MODEL,
+    }]
+    # 多后端时由路由器切换后端，客户端内部不再重试
+    max_retries = 0 if len(items) > 1 else 2
+    return [
+        LLMBackend(
+            name=item.get("name") or f"backend-{idx}",
+            model=item.get("model", settings.LLM_MODEL),
+            base_url=item["base_url"],
+            api_key=item.get("api_key", settings.API_KEY),
+            max_retries=max_retries
+        )
+        for idx, item in enumerate(items)
+    ]
+
+
+class LLMRouter:
+    """
+    多后端大模型路由
+    - 按延迟与错误率的移动平均评分选择后端
+    - 可选对冲：首个请求超过 p95 延迟未返回时向另一后端再发一次，取先返回的结果（对冲请求须另取调用名额，取不到时不对冲）
+    - 后端连续失败达到阈值时熔断，冷却后再试探；请求失败自动切换到其他后端
+    """
+
+    def __init__(self, backends: Optional[List[LLMBackend]] = None):
+        self.backends = backends or load_backends()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.hedge_skipped = 0
+        self.failovers = 0
+
+    @property
+    def primary(self) -> LLMBackend:
+        """配置中的第一个后端（用于缓存键与上下文预算）"""
+        return self.backends[0]
+
+    async def aclose(self):
+        for backend in self.backends:
+            if backend._client is not None:
+                await backend._client.close()
+
+    def select(self, exclude: tuple = ()) -> Optional[LLMBackend]:
+        """选择评分最优的可用后端；全部熔断时选择最早恢复的后端，避免完全不可用"""
+        candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        available = [b for b in candidates if b.available]
+        if available:
+            return min(available, key=lambda b: b.score())
+        return min(candidates, key=lambda b: b.open_until)
+
+    def hedge_delay(self, backend: LLMBackend) -> float:
+        p95 = backend.p95()
+        return max(p95, settings.LLM_HEDGE_DELAY) if p95 is not None else settings.LLM_HEDGE_DELAY
+
+    async def _attempt(self, backend: LLMBackend, stream: bool, kwargs: dict):
+        backend.requests += 1
+        backend.inflight += 1
+        start = time.perf_counter()
+        try:
+            with span("llm.call", backend=backend.name, stream=stream):
+                response = await backend.client.chat.completions.create(
+                    model=backend.model, stream=stream, **kwargs)
+        except asyncio.CancelledError:
+            LLM_BACKEND_REQUESTS.inc(backend=backend.name, outcome="cancelled")
+            raise
+        except Exception as e:
+            if is_backend_failure(e):
+                backend.record_failure()
+                LLM_BACKEND_REQUESTS.inc(backend=backend.name, outcome="failure")
+            else:
+                LLM_BACKEND_REQUESTS.inc(backend=backend.name, outcome="rejected")
+            raise
+        finally:
+            backend.inflight -= 1
+        # 流式调用此时只建立了流，耗时为首包耗时，不计入完整耗时统计
+        backend.record_success(time.perf_counter() - start, stream=stream)
+        LLM_BACKEND_REQUESTS.inc(backend=backend.name, outcome="success")
+        return response
+
+    async def chat(self, hedge_slot: Optional[Callable[[], "Optional[SlotLease]"]] = None, **kwargs):
+        """
+        非流式调用：按评分选择后端，失败切换，开启对冲时慢请求向第二个后端补发
+        hedge_slot 为对冲请求获取调用名额的函数（不排队，取不到返回 None），名额在对冲请求结束时归还
+        """
+        tried: List[LLMBackend] = []
+        tasks = {}
+        started = {}
+        hedge_backend: Optional[LLMBackend] = None
+
+        def launch(backend: LLMBackend, lease: "Optional[SlotLease]" = None):
+            tried.append(backend)
+            task = asyncio.ensure_future(self._attempt(backend, False, kwargs))
+            if lease is not None:
+                task.add_done_callback(lambda _: lease.release())
+            tasks[task] = backend
+            started[task] = time.perf_counter()
+
+        launch(self.select())
+        hedge_delay = self.hedge_delay(tried[0]) if settings.LLM_HEDGE_ENABLED \
+            and len(self.backends) > 1 else None
+        last_error: Optional[Exception] = None
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(
+                    tasks, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超过对冲延迟仍未返回：向另一后端补发（每次调用最多对冲一次）
+                    hedge_delay = None
+                    backend = self.select(exclude=tuple(tried))
+                    if backend is None:
+                        continue
+                    lease = hedge_slot() if hedge_slot is not None else None
+                    if hedge_slot is not None and lease is None:
+                        # 调用名额已满：对冲只会加重过载，放弃对冲继续等待首个请求
+                        self.hedge_skipped += 1
+                        logger.info(f"大模型调用名额已满，跳过对冲: {tried[0].name}")
+                        continue
+                    hedge_backend = backend
+                    self.hedged += 1
+                    logger.info(f"大模型请求对冲: {tried[0].name} -> {backend.name}")
+                    launch(backend, lease)
+                    continue
+
+                for task in done:
+                    backend = tasks.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if backend is hedge_backend:
+                            self.hedge_wins += 1
+                        return task.result()
+                    if not is_backend_failure(error):
+                        raise error
+                    last_error = error
+                    logger.warning(f"大模型后端调用失败: {backend.name}: {error}")
+
+                if not tasks:
+                    backend = self.select(exclude=tuple(tried))
+                    if backend is None:
+                        raise last_error
+                    self.failovers += 1
+                    hedge_delay = None
+                    launch(backend)
+            raise last_error
+        finally:
+            # 未完成的请求（对冲落败或调用被取消）按已等待时间记录下限延迟；
+            # 在此同步记录，保证下一次选择后端时已生效
+            for task, backend in tasks.items():
+                task.cancel()
+                backend.record_cancelled(time.perf_counter() - started[task])
+
+    async def stream(self, **kwargs):
+        """流式调用：建立流失败时切换后端（流一旦开始输出不再切换）"""
+        tried: List[LLMBackend] = []
+        while True:
+            backend = self.select(exclude=tuple(tried))
+            if backend is None:
+                raise last_error
+            if tried:
+                self.failovers += 1
+            tried.append(backend)
+            try:
+                return await self._attempt(backend, True, kwargs)
+            except Exception as e:
+                if not is_backend_failure(e):
+                    raise
+                last_error = e
+                logger.warning(f"大模型后端流式调用失败: {backend.name}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "hedge_enabled": settings.LLM_HEDGE_ENABLED,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_skipped": self.hedge_skipped,
+            "failovers": self.failovers,
+            "backends": [b.stats() for b in self.backends],
+        }
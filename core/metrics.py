@@ -0,0 +1,368 @@
+import bisect
+import math
+import os
+import re
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+"""
+Prometheus 文本格式指标（不依赖 prometheus_client）
+- 计数器、仪表、直方图在请求路径上只做字典查找与整数累加，开销可忽略
+- 缓存命中、排队数等已有统计在抓取时通过回调读取，不在请求路径上重复计数
+- 指标保存在进程内：多 worker 部署时每次抓取只返回处理该请求的 worker 的指标，
+  所有样本附带 worker 标签（进程号），不同 worker 的序列互不混淆
+"""
+
+from config.settings import settings
+
+# 请求/大模型耗时分桶（秒）
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+# 上游（百度）耗时分桶（秒）
+UPSTREAM_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# token 数分桶
+TOKEN_BUCKETS = (50, 100, 200, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+
+# 缓存统计中属于查询结果的计数项
+LOOKUP_RESULTS = ("hits", "shared_hits", "misses", "coalesced", "revalidated")
+
+LabelValues = Tuple[str, ...]
+
+_SAMPLE_NAME_RE = re.compile(r"[a-zA-Z_:][a-zA-Z0-9_:]*(\{)?")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in self._values.items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 每组标签：各分桶（不累计）计数 + 溢出桶，及总和
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0.0
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts in self._counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(round(self._sums[key], 6))}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class CallbackMetric(_Metric):
+    """抓取时通过回调读取数值，回调返回 [(标签值字典, 数值), ...]"""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[dict, float]]]
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, value in self.callback():
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, self._key(labels))} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(
+        self,
+        name: str,
+        documentation: str,
+        kind: str,
+        labelnames: Sequence[str],
+        callback: Callable[[], Iterable[Tuple[dict, float]]]
+    ):
+        """注册抓取时读取的指标；同名注册会替换（应用重新启动时绑定新的对象）"""
+        self.register(CallbackMetric(name, documentation, kind, labelnames, callback))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception:
+                # 单个回调出错不影响其他指标
+                continue
+        if settings.WORKERS > 1:
+            worker = f'worker="{os.getpid()}"'
+            lines = [line if line.startswith("#") else _add_label(line, worker) for line in lines]
+        return "\n".join(lines) + "\n"
+
+
+def _add_label(sample: str, label: str) -> str:
+    """给一行样本追加标签（name{a="1"} 2 -> name{worker="...",a="1"} 2）"""
+    match = _SAMPLE_NAME_RE.match(sample)
+    if match.group(1):
+        return f"{sample[:match.end()]}{label},{sample[match.end():]}"
+    return f"{sample[:match.end()]}{{{label}}}{sample[match.end():]}"
+
+
+registry = MetricsRegistry()
+
+# 接口请求
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "端到端请求耗时", ("method", "route", "status"))
+HTTP_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight", "正在处理的请求数")
+
+# 大模型调用
+LLM_REQUEST_SECONDS = registry.histogram(
+    "llm_request_duration_seconds", "大模型调用总耗时", ("summary_type", "stream"))
+LLM_TTFT_SECONDS = registry.histogram(
+    "llm_time_to_first_token_seconds", "大模型首个 token 耗时（非流式调用等于总耗时）", ("summary_type", "stream"))
+LLM_PROMPT_TOKENS = registry.histogram(
+    "llm_prompt_tokens", "大模型输入 token 数", ("summary_type",), TOKEN_BUCKETS)
+LLM_COMPLETION_TOKENS = registry.histogram(
+    "llm_completion_tokens", "大模型输出 token 数", ("summary_type",), TOKEN_BUCKETS)
+LLM_BACKEND_REQUESTS = registry.counter(
+    "llm_backend_requests_total", "各大模型后端调用次数", ("backend", "outcome"))
+
+# 百度上游
+UPSTREAM_SECONDS = registry.histogram(
+    "upstream_request_duration_seconds", "百度上游请求耗时（到响应头）", ("host", "status"), UPSTREAM_BUCKETS)
+
+
+def observe_upstream(host: str, seconds: float, status: Optional[int]):
+    UPSTREAM_SECONDS.observe(seconds, host=host, status=status if status is not None else "error")
+
+
+class MetricsMiddleware:
+    """
+    ASGI 中间件：记录端到端请求耗时与处理中请求数
+    耗时统计到响应体发送完毕（流式响应包含整个输出过程），路由按路径模板归类
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                # 未匹配路由的请求归为一类，避免任意路径产生大量标签
+                route=getattr(route, "path", "unmatched"),
+                status=status["code"]
+            )
+
+
+def register_state_metrics(state):
+    """注册从应用共享对象（app.state）读取的指标：缓存命中、排队、并发与后端健康状态"""
+    def caches():
+        generator = state.generator
+        return {
+            "summary_result": state.result_cache,
+            "caller_summary": generator.caller_cache,
+            "panorama": state.panorama_cache,
+            "baidu_proxy": state.proxy_cache,
+        }
+
+    def cache_lookups():
+        for name, cache in caches().items():
+            if cache is None:
+                continue
+            stats = cache.stats()
+            for result in LOOKUP_RESULTS:
+                if result in stats:
+                    yield {"cache": name, "result": result}, stats[result]
+
+    def cache_hit_ratio():
+        for name, cache in caches().items():
+            if cache is not None:
+                yield {"cache": name}, cache.stats()["hit_ratio"]
+
+    def scheduler_active():
+        yield {}, state.generator.scheduler.active
+
+    def scheduler_queued():
+        for priority, count in state.generator.scheduler.stats()["queued"].items():
+            yield {"priority": priority}, count
+
+    def backend_health():
+        for backend in state.generator.router.backends:
+            yield {"backend": backend.name}, 1 if backend.available else 0
+
+    def backend_inflight():
+        for backend in state.generator.router.backends:
+            yield {"backend": backend.name}, backend.inflight
+
+    def upstream_hosts(field):
+        def collect():
+            for host, stats in state.baidu_pool.host_stats().items():
+                yield {"host": host}, stats[field]
+        return collect
+
+    def log_sinks(field):
+        def collect():
+            from config.logging_conf import sink_stats
+            for sink, stats in sink_stats().items():
+                yield {"sink": sink}, stats[field]
+        return collect
+
+    registry.callback("log_records_dropped_total", "日志队列满时丢弃的日志条数",
+                      "counter", ("sink",), log_sinks("dropped"))
+    registry.callback("log_queue_depth", "日志队列中待写出的条数",
+                      "gauge", ("sink",), log_sinks("queued"))
+    registry.callback("cache_lookups_total", "缓存查询次数（按结果分类）",
+                      "counter", ("cache", "result"), cache_lookups)
+    registry.callback("cache_hit_ratio", "缓存命中率", "gauge", ("cache",), cache_hit_ratio)
+    registry.callback("llm_calls_in_flight", "正在进行的大模型调用数",
+                      "gauge", (), scheduler_active)
+    registry.callback("llm_queue_depth", "等待调用名额的大模型请求数",
+                      "gauge", ("priority",), scheduler_queued)
+    registry.callback("llm_backend_available", "大模型后端是否可用（未熔断）",
+                      "gauge", ("backend",), backend_health)
+    registry.callback("llm_backend_in_flight", "各大模型后端正在进行的调用数",
+                      "gauge", ("backend",), backend_inflight)
+    registry.callback("upstream_in_flight", "百度上游正在进行的请求数",
+                      "gauge", ("host",), upstream_hosts("in_flight"))
+    registry.callback("upstream_waiting", "等待域名并发名额的百度上游请求数",
+                      "gauge", ("host",), upstream_hosts("waiting"))
@@ -1,6 +1,6 @@
 from enum import Enum
 from typing import List, Optional, Dict
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 # 数据模型
@@ -38,11 +38,40 @@ class JavaData(BaseModel):
     allAnswers: Dict[str, Dict[str, str]]  # caller_id -> {question: answer}
 
 
+class CallerInfo(BaseModel):
+    """总结结果中单个报警人的信息（summary_type=3 时只有 summary）"""
+    # 提示词可能要求输出其他字段（如位置），校验时原样保留
+    model_config = ConfigDict(extra="allow")
+
+    identity: Optional[str] = None
+    phone: Optional[str] = None
+    summary: str
+    isTrapped: Optional[bool] = None
+
+    @field_validator("identity", "phone", mode="before")
+    @classmethod
+    def _number_to_str(cls, value):
+        """大模型常把电话号码等输出为数字，转为字符串"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        return value
+
+
+class SummaryPayload(BaseModel):
+    """大模型输出的总结结构"""
+    model_config = ConfigDict(extra="allow")
+
+    total_info: str
+    callers: List[CallerInfo]
+
+
 class SummaryResponse(BaseModel):
     """大模型返回数据"""
     case_id: str
     summary: str
     guidance_type: str
+    # 总结是否通过结构校验（仅服务内部使用，不输出）；未通过的结果不写入缓存
+    valid: bool = Field(default=True, exclude=True)
 
 
 class IncrementalSummaryRequest(BaseModel):
@@ -51,6 +80,27 @@ class IncrementalSummaryRequest(BaseModel):
     question: str
     caller_id: Optional[str] = "main_caller"  # 可选，用于区分报警人，但输出始终只一个
     answer: str
-    current_summary: Optional[str] = None  # 上一轮的完整总结（JSON字符串）
+    current_summary: Optional[str] = None  # 上一轮的完整总结（JSON字符串），不传则使用服务端保存的摘要
     guidance_type: str  # 保留，用于保持一致性
     prompt: str  # 用户自定义提示词（如提取被困、身份等）
+    version: Optional[int] = None  # 本次更新序号（单调递增），用于识别乱序提交；不传则服务端自动递增
+
+
+class BatchSummaryRequest(BaseModel):
+    """批量总结请求数据"""
+    items: List[JavaData]
+    stream: bool = False  # True: 以 NDJSON 按完成顺序逐条返回；False: 全部完成后按原顺序返回
+
+
+class BatchSummaryItem(BaseModel):
+    """批量总结中单个案件的结果"""
+    index: int  # 在请求 items 中的位置
+    case_id: str
+    success: bool
+    summary: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchSummaryResponse(BaseModel):
+    """批量总结返回数据（按请求顺序）"""
+    results: List[BatchSummaryItem]
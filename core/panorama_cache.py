@@ -0,0 +1,45 @@
+from dataclasses import dataclass
+
+from config.settings import settings
+from core.cache import CoalescingCache
+
+
+@dataclass
+class PanoramaImage:
+    """一张缓存的全景图"""
+    content: bytes
+    content_type: str
+
+
+def panorama_cache_key(
+    location: str,
+    width: int,
+    height: int,
+    fov: int,
+    heading: int,
+    pitch: int,
+    coordtype: str
+) -> tuple:
+    """缓存键：坐标按配置精度取整，其余视角参数原样参与"""
+    try:
+        lng, lat = (float(v) for v in location.split(","))
+        precision = settings.PANORAMA_CACHE_PRECISION
+        location = f"{round(lng, precision)},{round(lat, precision)}"
+    except ValueError:
+        location = location.strip()
+    return (location, width, height, fov, heading, pitch, coordtype)
+
+
+class PanoramaCache(CoalescingCache):
+    """
+    全景图缓存
+    - 按 TTL 过期，按总字节数淘汰
+    - 相同参数的并发请求合并为一次上游调用（singleflight）
+    """
+
+    def __init__(self):
+        super().__init__(
+            ttl=settings.PANORAMA_CACHE_TTL,
+            max_bytes=settings.PANORAMA_CACHE_MB * 1024 * 1024,
+            sizeof=lambda image: len(image.content)
+        )
@@ -0,0 +1,120 @@
+import asyncio
+import contextvars
+import weakref
+from typing import Awaitable, Callable, List, Optional, Set
+
+from loguru import logger
+
+from config.settings import settings
+from core.panorama_cache import PanoramaCache, PanoramaImage, panorama_cache_key
+from core.shared_store import RateCounter, SharedStore
+
+
+class PanoramaPrefetcher:
+    """
+    全景图邻近视角预取
+    - 返回一个视角后，在后台把同一位置相邻 heading 的视角加载到全景图缓存，操作员转动视角时直接命中
+    - 已缓存或正在加载的视角跳过；预取期间到达的相同请求合并到这次加载
+    - 同一位置同时进行的预取数受限，待执行的预取任务总数有上限，超出时直接丢弃
+    - 只在确认未缓存、需要实际请求百度时扣减预取配额（多 worker 时经共享存储合计），超出时跳过，避免耗尽百度 API 配额
+    """
+
+    def __init__(self, cache: PanoramaCache, store: Optional[SharedStore] = None):
+        self.cache = cache
+        self.quota = RateCounter(
+            "panorama_prefetch", settings.PANORAMA_PREFETCH_PER_MIN, 60.0, store)
+        self._location_semaphores: "weakref.WeakValueDictionary[str, asyncio.Semaphore]" = \
+            weakref.WeakValueDictionary()
+        self._tasks: Set[asyncio.Task] = set()
+        self._stats = {
+            "scheduled": 0,
+            "fetched": 0,
+            "already_cached": 0,
+            "quota_skipped": 0,
+            "dropped": 0,
+            "failed": 0,
+        }
+
+    def neighbor_headings(self, heading: int) -> List[int]:
+        """相邻视角：heading ± 步长×1..N（取模 360，去重，由近及远）"""
+        headings = []
+        for i in range(1, settings.PANORAMA_PREFETCH_NEIGHBORS + 1):
+            for sign in (1, -1):
+                candidate = (heading + sign * i * settings.PANORAMA_PREFETCH_STEP) % 360
+                if candidate != heading % 360 and candidate not in headings:
+                    headings.append(candidate)
+        return headings
+
+    def schedule(self, params: dict, fetch: Callable[[dict], Awaitable[PanoramaImage]]):
+        """
+        在后台预取 params 所指视角的相邻视角，立即返回
+        params 为请求百度的完整参数，fetch 为实际请求百度的函数
+        """
+        for heading in self.neighbor_headings(params["heading"]):
+            view = {**params, "heading": heading}
+            if self.cache.peek(self._key(view)) is not None:
+                self._stats["already_cached"] += 1
+                continue
+            if len(self._tasks) >= settings.PANORAMA_PREFETCH_MAX_PENDING:
+                self._stats["dropped"] += 1
+                continue
+            # 在空上下文中创建任务，不继承当前请求的 trace 等上下文
+            task = contextvars.Context().run(
+                asyncio.ensure_future, self._prefetch(view, fetch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            self._stats["scheduled"] += 1
+
+    @staticmethod
+    def _key(view: dict) -> tuple:
+        return panorama_cache_key(
+            view["location"], view["width"], view["height"], view["fov"],
+            view["heading"], view["pitch"], view["coordtype"])
+
+    def _location_semaphore(self, location: str) -> asyncio.Semaphore:
+        """获取位置级别的并发限制（无任务使用时自动回收）"""
+        semaphore = self._location_semaphores.get(location)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(settings.PANORAMA_PREFETCH_PER_LOCATION)
+            self._location_semaphores[location] = semaphore
+        return semaphore
+
+    async def _prefetch(self, view: dict, fetch: Callable[[dict], Awaitable[PanoramaImage]]):
+        key = self._key(view)
+        quota_denied = False
+
+        def admit() -> bool:
+            # 只有确实需要请求百度时才扣减配额（排队期间可能已被用户请求或其他预取加载）
+            nonlocal quota_denied
+            quota_denied = not self.quota.hit()[0]
+            return not quota_denied
+
+        async with self._location_semaphore(key[0]):
+            try:
+                fetched = await self.cache.prefetch(key, lambda: fetch(view), admit)
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.warning(f"全景图预取失败, 位置={view['location']}, heading={view['heading']}: {e}")
+                return
+        if fetched:
+            self._stats["fetched"] += 1
+        elif quota_denied:
+            self._stats["quota_skipped"] += 1
+        else:
+            self._stats["already_cached"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "pending": len(self._tasks),
+            "step": settings.PANORAMA_PREFETCH_STEP,
+            "neighbors": settings.PANORAMA_PREFETCH_NEIGHBORS,
+            "quota_per_min": self.quota.limit,
+        }
+
+    async def aclose(self):
+        """取消未完成的预取任务"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
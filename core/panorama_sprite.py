@@ -0,0 +1,39 @@
+import io
+from typing import List, Optional
+
+from config.settings import settings
+
+"""
+多视角全景图拼接为一张横向长图（sprite）
+依赖 Pillow（可选），未安装时 /panorama/multi 不支持 format=sprite
+"""
+
+# 获取失败的视角以灰色填充
+PLACEHOLDER_COLOR = (128, 128, 128)
+
+
+def sprite_available() -> bool:
+    try:
+        import PIL  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def build_sprite(images: List[Optional[bytes]], width: int, height: int) -> bytes:
+    """按顺序横向拼接各视角图片（每张 width×height，第 i 张位于 x=i*width），返回 JPEG"""
+    from PIL import Image
+
+    sprite = Image.new("RGB", (width * len(images), height), PLACEHOLDER_COLOR)
+    for index, content in enumerate(images):
+        if content is None:
+            continue
+        with Image.open(io.BytesIO(content)) as view:
+            view = view.convert("RGB")
+            if view.size != (width, height):
+                view = view.resize((width, height))
+            sprite.paste(view, (index * width, 0))
+
+    output = io.BytesIO()
+    sprite.save(output, format="JPEG", quality=settings.PANORAMA_SPRITE_QUALITY)
+    return output.getvalue()
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Mapping, Optional
+
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+
+from config.settings import settings
+from core.cache import LRUCache
+
+# 缓存键中忽略的查询参数（密钥不参与缓存键）
+IGNORED_KEY_PARAMS = {"ak"}
+
+# 写入缓存时保留的上游响应头
+CACHED_HEADERS = {
+    "content-type",
+    "cache-control",
+    "etag",
+    "last-modified",
+    "expires",
+    "access-control-allow-origin",
+}
+
+
+@dataclass
+class CachedResource:
+    """一条缓存的上游资源（body 可能为压缩后的内容，编码见 headers 中的 content-encoding）"""
+    body: bytes
+    status_code: int
+    headers: Dict[str, str] = field(default_factory=dict)
+    expires_at: float = 0.0
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """条件请求头，用于过期后向上游重新验证"""
+        headers = {}
+        if "etag" in self.headers:
+            headers["If-None-Match"] = self.headers["etag"]
+        if "last-modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["last-modified"]
+        return headers
+
+
+def make_cache_key(host: str, path: str, params: Mapping[str, str]) -> str:
+    """缓存键：域名 + 路径 + 排序后的查询参数（忽略 ak）"""
+    query = "&".join(
+        f"{k}={v}" for k, v in sorted(params.items())
+        if k not in IGNORED_KEY_PARAMS
+    )
+    raw = f"{host}/{path.lstrip('/')}?{query}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cache_expiry(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """
+    根据上游 Cache-Control / Expires 计算过期时间
+    - 返回 None 表示不可缓存（no-store / private）
+    - no-cache 可缓存但每次都需重新验证
+    - 未声明缓存策略时使用默认 TTL
+    """
+    now = now or time.time()
+    cache_control = headers.get("cache-control", "").lower()
+    directives = {}
+    for part in cache_control.split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+
+    if "no-store" in directives or "private" in directives:
+        return None
+    if "no-cache" in directives:
+        return now
+
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return now + max(int(directives[name]), 0)
+            except ValueError:
+                break
+
+    expires = headers.get("expires")
+    if expires:
+        try:
+            return parsedate_to_datetime(expires).timestamp()
+        except (TypeError, ValueError):
+            return now
+
+    return now + settings.PROXY_CACHE_DEFAULT_TTL
+
+
+class DiskCache:
+    """
+    磁盘缓存层：每个条目一个文件（首行为 JSON 元数据，其余为内容）
+    超过总容量时按最近访问时间淘汰
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        # 读写在线程池中执行，索引操作需要加锁
+        self._lock = threading.Lock()
+        self._load_index()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def _load_index(self):
+        """启动时扫描缓存目录，按修改时间重建 LRU 索引"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = []
+        for path in self.directory.glob("*/*"):
+            if path.suffix == ".tmp":
+                path.unlink(missing_ok=True)
+                continue
+            stat = path.stat()
+            files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self.current_bytes += size
+        self._evict()
+
+    def get(self, key: str) -> Optional[CachedResource]:
+        if key not in self._index:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            with self._lock:
+                self._remove(key)
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return CachedResource(body=body, **meta)
+
+    def set(self, key: str, entry: CachedResource):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = json.dumps({
+            "status_code": entry.status_code,
+            "headers": entry.headers,
+            "expires_at": entry.expires_at,
+        }, ensure_ascii=False).encode("utf-8")
+
+        # 先写临时文件再替换，避免读到写了一半的文件
+        tmp_path = path.parent / f"{key}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(meta + b"\n")
+            f.write(entry.body)
+        os.replace(tmp_path, path)
+
+        size = path.stat().st_size
+        with self._lock:
+            self.current_bytes -= self._index.pop(key, 0)
+            self._index[key] = size
+            self.current_bytes += size
+            self._evict()
+
+    def _remove(self, key: str):
+        self.current_bytes -= self._index.pop(key, 0)
+        self._path(key).unlink(missing_ok=True)
+
+    def _evict(self):
+        while self._index and self.current_bytes > self.max_bytes:
+            key = next(iter(self._index))
+            self._remove(key)
+
+
+class ProxyCache:
+    """
+    百度地图资源两级缓存：内存 LRU + 磁盘
+    - 遵循上游 Cache-Control / Expires，过期后使用 ETag / Last-Modified 条件请求重新验证
+    - 统计命中情况，便于观察命中率
+    """
+
+    def __init__(self):
+        self.max_entry_bytes = settings.PROXY_CACHE_MAX_ENTRY_KB * 1024
+        self.memory = LRUCache(settings.PROXY_CACHE_MEMORY_MB * 1024 * 1024)
+        self.disk: Optional[DiskCache] = None
+        if settings.PROXY_CACHE_DISK_MB > 0:
+            try:
+                self.disk = DiskCache(settings.PROXY_CACHE_DISK_DIR,
+                                      settings.PROXY_CACHE_DISK_MB * 1024 * 1024)
+            except OSError as e:
+                logger.error(f"磁盘缓存初始化失败，仅使用内存缓存: {e}")
+        self._stats = {
+            "hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "revalidated": 0,
+            "misses": 0,
+            "stores": 0,
+            "uncacheable": 0,
+        }
+
+    def record(self, name: str):
+        self._stats[name] += 1
+
+    async def get(self, key: str) -> Optional[CachedResource]:
+        """先查内存，再查磁盘；磁盘命中后提升到内存"""
+        entry = self.memory.get(key)
+        if entry is not None:
+            self._stats["memory_hits"] += 1
+            return entry
+
+        if self.disk is None:
+            return None
+        entry = await run_in_threadpool(self.disk.get, key)
+        if entry is not None:
+            self._stats["disk_hits"] += 1
+            self.memory.set(key, entry, len(entry.body))
+        return entry
+
+    async def put(self, key: str, entry: CachedResource) -> bool:
+        """写入两级缓存，过大的条目不缓存"""
+        if len(entry.body) > self.max_entry_bytes:
+            self._stats["uncacheable"] += 1
+            return False
+
+        self.memory.set(key, entry, len(entry.body))
+        if self.disk is not None:
+            try:
+                await run_in_threadpool(self.disk.set, key, entry)
+            except OSError as e:
+                logger.warning(f"写入磁盘缓存失败: {e}")
+        self._stats["stores"] += 1
+        return True
+
+    def build_entry(
+        self,
+        body: bytes,
+        status_code: int,
+        headers: Mapping[str, str],
+        encoding: Optional[str] = None
+    ) -> Optional[CachedResource]:
+        """根据上游响应构建缓存条目，不可缓存时返回 None；encoding 为 body 的压缩编码（未压缩为 None）"""
+        if status_code != 200 or not body:
+            return None
+        expires_at = cache_expiry(headers)
+        if expires_at is None:
+            return None
+        entry_headers = {k.lower(): v for k, v in headers.items()
+                         if k.lower() in CACHED_HEADERS}
+        if encoding:
+            entry_headers["content-encoding"] = encoding
+        return CachedResource(
+            body=body,
+            status_code=status_code,
+            headers=entry_headers,
+            expires_at=expires_at,
+        )
+
+    def refresh(self, entry: CachedResource, headers: Mapping[str, str]) -> CachedResource:
+        """304 重新验证成功后，用新的响应头刷新过期时间"""
+        for k, v in headers.items():
+            if k.lower() in CACHED_HEADERS and k.lower() != "content-type":
+                entry.headers[k.lower()] = v
+        entry.expires_at = cache_expiry(entry.headers) or time.time()
+        return entry
+
+    def stats(self) -> dict:
+        lookups = self._stats["hits"] + \
+            self._stats["revalidated"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": round((self._stats["hits"] + self._stats["revalidated"]) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "memory_bytes": self.memory.current_bytes,
+            "disk_entries": len(self.disk._index) if self.disk else 0,
+            "disk_bytes": self.disk.current_bytes if self.disk else 0,
+        }
@@ -0,0 +1,87 @@
+import hashlib
+import json
+from typing import Optional
+
+from config.settings import settings
+from core.cache import CoalescingCache
+from core.models import SummaryRequest, QA
+from core.shared_store import SharedStore
+
+
+def summary_request_key(request_data: SummaryRequest, model: str, temperature: float) -> str:
+    """
+    规范化请求后计算哈希作为缓存键
+    - 包含模型、温度、指引类型、总结类型、提示词、背景及按顺序的问答
+    - 不包含案件ID：相同内容的重试（或相同问答）复用同一结果
+    """
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "guidance_type": request_data.guidance_type.strip(),
+        "summary_type": request_data.summary_type,
+        "prompt": request_data.prompt.strip(),
+        "case_context": (request_data.case_context or "").strip(),
+        "qa_list": [
+            [qa.caller_id, [[p.question.strip(), p.answer.strip()] for p in qa.qa_pairs]]
+            for qa in request_data.qa_list
+        ],
+    }
+    raw = json.dumps(payload, ensure_ascii=False,
+                     sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def caller_summary_key(
+    request_data: SummaryRequest,
+    qa: QA,
+    model: str,
+    temperature: float
+) -> str:
+    """单个报警人总结（map 阶段）的缓存键：只与该报警人的问答及生成参数有关"""
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "guidance_type": request_data.guidance_type.strip(),
+        "prompt": request_data.prompt.strip(),
+        "case_context": (request_data.case_context or "").strip(),
+        "caller_id": qa.caller_id,
+        "qa_pairs": [[p.question.strip(), p.answer.strip()] for p in qa.qa_pairs],
+    }
+    raw = json.dumps(payload, ensure_ascii=False,
+                     sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SummaryResultCache(CoalescingCache):
+    """
+    /summary/generate 结果缓存
+    - Java 后台超时重试时相同请求直接返回已有结果
+    - 相同请求并发到达时只调用一次大模型
+    - 配置共享存储时，重试请求落到其他 worker 同样命中
+    """
+
+    def __init__(self, store: Optional[SharedStore] = None):
+        super().__init__(
+            ttl=settings.SUMMARY_CACHE_TTL,
+            max_bytes=settings.SUMMARY_CACHE_MB * 1024 * 1024,
+            sizeof=lambda summary: len(summary.encode("utf-8")),
+            store=store,
+            namespace="summary"
+        )
+
+
+class CallerSummaryCache(CoalescingCache):
+    """
+    多报警人分治总结中单个报警人的结果缓存
+    新报警人加入案件时，已有报警人的问答不变即可直接复用
+    """
+
+    def __init__(self, store: Optional[SharedStore] = None):
+        super().__init__(
+            ttl=settings.CALLER_CACHE_TTL,
+            max_bytes=settings.CALLER_CACHE_MB * 1024 * 1024,
+            sizeof=lambda caller: len(json.dumps(
+                caller, ensure_ascii=False).encode("utf-8")),
+            store=store,
+            namespace="caller_summary"
+        )
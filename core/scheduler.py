@@ -0,0 +1,215 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+from core.shared_store import RateCounter, SharedStore
+from core.tracing import span
+
+
+class Priority(IntEnum):
+    """大模型调用优先级，数值越小越优先"""
+    INCREMENTAL = 0  # 实时增量更新
+    FULL = 1         # 完整总结
+    BATCH = 2        # 批量任务
+
+
+# 当前请求的大模型调用优先级，由路由在处理请求时设置
+llm_priority: ContextVar[Priority] = ContextVar(
+    "llm_priority", default=Priority.FULL)
+
+
+class SchedulerOverloaded(Exception):
+    """排队预计超过该优先级的等待期限（或等待超时），应返回 429"""
+
+    def __init__(self, priority: Priority, retry_after: float, reason: str):
+        self.priority = priority
+        self.retry_after = retry_after
+        super().__init__(f"大模型调用繁忙（{reason}），请 {self.retry_after_seconds} 秒后重试")
+
+    @property
+    def retry_after_seconds(self) -> int:
+        return max(1, math.ceil(self.retry_after))
+
+
+def _queue_deadlines() -> Dict[Priority, float]:
+    """各优先级的排队期限（秒），LLM_QUEUE_DEADLINES 按 增量,完整,批量 顺序配置"""
+    values = [float(v) for v in settings.LLM_QUEUE_DEADLINES]
+    return {p: values[min(p, len(values) - 1)] for p in Priority}
+
+
+class LLMScheduler:
+    """
+    大模型调用准入与优先级调度
+    - 同时进行的调用数不超过 LLM_MAX_CONCURRENCY，超出的按优先级排队（同优先级先到先得）
+    - 按平均调用耗时估算排队时间，超过该优先级的期限时直接拒绝（429 + Retry-After），不再排队
+    - 排队超过期限仍未轮到时同样拒绝，避免过载时所有请求一起超时
+    - 多 worker 部署时并发上限按 worker 数分摊；调用频率上限经共享存储在所有 worker 间合计
+    """
+
+    def __init__(self, max_concurrency: int = None, store: Optional[SharedStore] = None):
+        if max_concurrency is None:
+            max_concurrency = math.ceil(settings.LLM_MAX_CONCURRENCY / max(1, settings.WORKERS))
+        self.max_concurrency = max_concurrency
+        self.rate_limit = RateCounter(
+            "llm_calls", settings.LLM_RATE_LIMIT_PER_MIN, 60.0, store
+        ) if settings.LLM_RATE_LIMIT_PER_MIN > 0 else None
+        self.deadlines = _queue_deadlines()
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        # 单次调用耗时的移动平均（秒），用于估算排队时间
+        self.ewma_service = settings.LLM_READ_TIMEOUT / 10
+        self.admitted = {p.name: 0 for p in Priority}
+        self.rejected = {p.name: 0 for p in Priority}
+        self.timed_out = {p.name: 0 for p in Priority}
+        self.rate_limited = {p.name: 0 for p in Priority}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def queued(self, priority: Priority = None) -> int:
+        """排队中的请求数；指定优先级时统计排在其前面（含同优先级）的请求数"""
+        return sum(
+            1 for p, _, fut in self._waiters
+            if not fut.done() and (priority is None or p <= priority)
+        )
+
+    def estimated_wait(self, priority: Priority) -> float:
+        """按排在前面的请求数估算排队时间（秒）"""
+        ahead = self.queued(priority) + 1
+        return ahead * self.ewma_service / self.max_concurrency
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = None, lease: "Optional[SlotLease]" = None):
+        """
+        获取一个调用名额；priority 缺省时使用当前请求上下文中的优先级
+        传入已获取的 lease 时不再重复获取，退出时归还该名额
+        """
+        if lease is None:
+            lease = await self.acquire(priority)
+        try:
+            yield
+        finally:
+            lease.release()
+
+    async def acquire(self, priority: Priority = None) -> "SlotLease":
+        """
+        获取一个调用名额并返回租约，由调用方在调用结束后 release
+        用于名额需要跨越当前调用栈持有的场景（如流式响应：返回响应前获取，流结束后归还）
+        """
+        priority = llm_priority.get() if priority is None else priority
+        self._check_rate_limit(priority)
+        if not self.enabled:
+            return SlotLease(None)
+        await self._acquire(priority)
+        return SlotLease(self)
+
+    def try_acquire(self, priority: Priority = None) -> "Optional[SlotLease]":
+        """不排队地获取一个名额（用于对冲等可选调用）：名额已满、有请求排队或超过频率上限时返回 None"""
+        priority = llm_priority.get() if priority is None else priority
+        if self.enabled and (self.active >= self.max_concurrency or self.queued()):
+            return None
+        try:
+            self._check_rate_limit(priority)
+        except SchedulerOverloaded:
+            return None
+        if not self.enabled:
+            return SlotLease(None)
+        self.active += 1
+        self.admitted[priority.name] += 1
+        return SlotLease(self)
+
+    def _check_rate_limit(self, priority: Priority):
+        if self.rate_limit is not None:
+            allowed, reset_in = self.rate_limit.hit()
+            if not allowed:
+                self.rate_limited[priority.name] += 1
+                raise SchedulerOverloaded(priority, reset_in, "超过调用频率上限")
+
+    async def _acquire(self, priority: Priority):
+        if self.active < self.max_concurrency and not self.queued():
+            self.active += 1
+            self.admitted[priority.name] += 1
+            return
+
+        deadline = self.deadlines[priority]
+        wait = self.estimated_wait(priority)
+        if wait > deadline:
+            self.rejected[priority.name] += 1
+            logger.warning(
+                f"大模型调用排队预计 {wait:.1f}s 超过期限 {deadline}s，拒绝 {priority.name} 请求")
+            raise SchedulerOverloaded(priority, wait, "排队已满")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        try:
+            # 名额由 _release 直接转交（active 不变）
+            with span("llm.queue", priority=priority.name, queued=self.queued(priority)):
+                await asyncio.wait_for(asyncio.shield(future), timeout=deadline)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.timed_out[priority.name] += 1
+                raise SchedulerOverloaded(
+                    priority, self.estimated_wait(priority), "排队超时")
+        except asyncio.CancelledError:
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                # 名额已转交但请求被取消，归还名额
+                self._release()
+            raise
+        self.admitted[priority.name] += 1
+
+    def _finish(self, elapsed: float):
+        """调用结束：更新平均调用耗时并归还名额"""
+        self.ewma_service = 0.2 * elapsed + 0.8 * self.ewma_service
+        self._release()
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": {p.name: sum(1 for q, _, f in self._waiters if q == p and not f.done()) for p in Priority},
+            "deadlines_s": {p.name: d for p, d in self.deadlines.items()},
+            "ewma_service_s": round(self.ewma_service, 3),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "rate_limit_per_min": self.rate_limit.limit if self.rate_limit else 0,
+            "rate_limited": self.rate_limited,
+        }
+
+
+class SlotLease:
+    """已获取的调用名额；release 可重复调用，只归还一次"""
+
+    def __init__(self, scheduler: Optional[LLMScheduler]):
+        self._scheduler = scheduler
+        self._start = time.perf_counter()
+        self._released = scheduler is None
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._scheduler._finish(time.perf_counter() - self._start)
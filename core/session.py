@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+import weakref
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+from config.settings import settings
+from core.cache import TTLCache
+from core.shared_store import SharedStore
+
+# 使用共享存储时每保存多少次检查一次会话数上限
+TRIM_EVERY_SAVES = 100
+
+
+@dataclass
+class SessionState:
+    """单个报警人的最新增量摘要"""
+    summary: str
+    version: int
+    updated_at: float
+
+
+class SessionConflictError(Exception):
+    """增量更新的版本号不大于服务端已记录的版本（乱序或重复提交）"""
+
+    def __init__(self, current_version: int, received_version: int):
+        self.current_version = current_version
+        self.received_version = received_version
+        super().__init__(
+            f"版本冲突：服务端版本 {current_version}，收到版本 {received_version}")
+
+
+class SummarySessionStore:
+    """
+    增量总结会话存储：按 (case_id, caller_id) 保存最新摘要及版本号
+    - 客户端只需上传新的问答，历史摘要由服务端维护
+    - 按 TTL 过期，按会话数与总字节数淘汰最久未更新的会话
+    - 同一报警人的更新通过锁串行执行，保证每次都基于上一次结果
+    - 配置共享存储时以共享存储为准，各 worker 看到同一份会话；
+      锁只在进程内有效，跨 worker 的并发更新由保存时的版本号比较保证不回退；
+      会话数同样受 SESSION_MAX_COUNT 限制（定期淘汰最久未更新的会话）
+    """
+
+    def __init__(self, store: Optional[SharedStore] = None):
+        self.store = store
+        self.sessions = TTLCache(
+            ttl=settings.SESSION_TTL,
+            max_bytes=settings.SESSION_MAX_MB * 1024 * 1024,
+            max_items=settings.SESSION_MAX_COUNT
+        )
+        self._locks: "weakref.WeakValueDictionary[tuple, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self._shared_saves = 0
+
+    def lock(self, case_id: str, caller_id: str) -> asyncio.Lock:
+        """获取报警人级别的锁（无人持有时自动回收）"""
+        key = (case_id, caller_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+    @staticmethod
+    def _shared_key(case_id: str, caller_id: str) -> str:
+        return json.dumps([case_id, caller_id], ensure_ascii=False)
+
+    def get(self, case_id: str, caller_id: str) -> Optional[SessionState]:
+        if self.store is not None:
+            data = self.store.get("session", self._shared_key(case_id, caller_id))
+            return SessionState(**data) if data else None
+        return self.sessions.get((case_id, caller_id))
+
+    def next_version(self, state: Optional[SessionState], version: Optional[int]) -> int:
+        """
+        计算本次更新的版本号
+        - 客户端未传版本号时自动递增
+        - 客户端传入的版本号不大于已记录版本时抛出 SessionConflictError
+        """
+        current = state.version if state else 0
+        if version is None:
+            return current + 1
+        if version <= current:
+            raise SessionConflictError(current, version)
+        return version
+
+    def save(self, case_id: str, caller_id: str, summary: str, version: int) -> Optional[SessionState]:
+        """保存最新摘要；若期间已有更新的版本写入则放弃，返回 None"""
+        if self.store is not None:
+            state = SessionState(summary=summary, version=version, updated_at=time.time())
+            saved = self.store.set_if_newer(
+                "session", self._shared_key(case_id, caller_id), asdict(state), version, settings.SESSION_TTL)
+            if saved:
+                self._shared_saves += 1
+                if self._shared_saves % TRIM_EVERY_SAVES == 0:
+                    self.store.trim("session", settings.SESSION_MAX_COUNT)
+            return state if saved else None
+
+        current = self.get(case_id, caller_id)
+        if current is not None and current.version >= version:
+            return None
+        state = SessionState(summary=summary, version=version,
+                             updated_at=time.time())
+        self.sessions.set((case_id, caller_id), state,
+                          len(summary.encode("utf-8")))
+        return state
@@ -0,0 +1,200 @@
+import functools
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from loguru import logger
+
+from config.settings import settings
+
+# 每写入多少次清理一次过期数据
+PURGE_EVERY_WRITES = 1000
+
+
+def _fail_open(default=None):
+    """
+    锁等待超过 busy timeout 等 SQLite 操作错误时记录告警并返回 default，不阻塞也不中断请求
+    （读取视为未命中，写入视为放弃，计数返回 None 由限流放行）
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                self.busy_errors += 1
+                logger.warning(f"共享存储操作失败（{method.__name__}）: {e}")
+                return default
+        return wrapper
+    return decorator
+
+
+class SharedStore:
+    """
+    多 worker 共享的本地键值存储（SQLite WAL 模式）
+    - 同一台机器上的所有 worker 进程打开同一个数据库文件，看到一致的数据
+    - WAL 模式下读写互不阻塞，单次读写为本地文件操作（微秒级），直接在事件循环中调用；
+      等待其他 worker 写锁最多 SHARED_STORE_BUSY_TIMEOUT_MS，超时则放弃本次操作，避免冻结事件循环
+    - 值以 JSON 保存，按命名空间区分用途，支持 TTL、带版本号的条件写入及计数器
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(
+            path, timeout=settings.SHARED_STORE_BUSY_TIMEOUT_MS / 1000,
+            isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS kv (
+                ns TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 0,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (ns, key)
+            ) WITHOUT ROWID
+        """)
+        # 连接在线程间共享（如 to_thread），用锁串行化
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.busy_errors = 0
+
+    def get(self, ns: str, key: str) -> Optional[Any]:
+        entry = self.get_versioned(ns, key)
+        return entry[0] if entry else None
+
+    @_fail_open()
+    def get_versioned(self, ns: str, key: str) -> Optional[Tuple[Any, int]]:
+        """返回 (值, 版本号)；不存在或已过期时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, version FROM kv WHERE ns = ? AND key = ? AND expires_at > ?",
+                (ns, key, time.time())
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    @_fail_open()
+    def set(self, ns: str, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (ns, key, value, version, expires_at) VALUES (?, ?, ?, 0, ?)",
+                (ns, key, json.dumps(value, ensure_ascii=False), time.time() + ttl)
+            )
+            self._after_write()
+
+    @_fail_open(False)
+    def set_if_newer(self, ns: str, key: str, value: Any, version: int, ttl: float) -> bool:
+        """仅当已有记录不存在、已过期或版本更旧时写入（原子操作），返回是否写入"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                INSERT INTO kv (ns, key, value, version, expires_at) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (ns, key) DO UPDATE SET
+                    value = excluded.value, version = excluded.version, expires_at = excluded.expires_at
+                WHERE kv.version < excluded.version OR kv.expires_at <= ?
+                """,
+                (ns, key, json.dumps(value, ensure_ascii=False), version, now + ttl, now)
+            )
+            self._after_write()
+            return cursor.rowcount > 0
+
+    @_fail_open()
+    def incr(self, ns: str, key: str, amount: int = 1, ttl: float = 60.0) -> Optional[int]:
+        """计数器加 amount 并返回新值（原子操作）；过期后从 0 重新计数；存储繁忙时返回 None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                INSERT INTO kv (ns, key, value, version, expires_at) VALUES (?, ?, ?, 0, ?)
+                ON CONFLICT (ns, key) DO UPDATE SET
+                    value = CASE WHEN kv.expires_at > ? THEN CAST(kv.value AS INTEGER) + ? ELSE ? END,
+                    expires_at = CASE WHEN kv.expires_at > ? THEN kv.expires_at ELSE excluded.expires_at END
+                RETURNING value
+                """,
+                (ns, key, str(amount), now + ttl, now, amount, amount, now)
+            ).fetchone()
+            self._after_write()
+        return int(row[0])
+
+    @_fail_open(0)
+    def trim(self, ns: str, max_entries: int) -> int:
+        """命名空间内条目超过 max_entries 时删除过期时间最早的条目（同一 TTL 下即最久未更新的），返回删除条数"""
+        with self._lock:
+            cursor = self._conn.execute(
+                """
+                DELETE FROM kv WHERE ns = ? AND key IN (
+                    SELECT key FROM kv WHERE ns = ? ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (ns, ns, max_entries)
+            )
+            return cursor.rowcount
+
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % PURGE_EVERY_WRITES == 0:
+            self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ns, COUNT(*) FROM kv WHERE expires_at > ? GROUP BY ns", (time.time(),)
+            ).fetchall()
+        return {"path": self.path, "busy_errors": self.busy_errors,
+                "entries": {ns: count for ns, count in rows}}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_shared_store(path: str) -> Optional[SharedStore]:
+    """打开共享存储；路径为空或打开失败时返回 None（退回进程内缓存）"""
+    if not path:
+        return None
+    try:
+        store = SharedStore(path)
+        logger.info(f"多 worker 共享存储已启用: {path}")
+        return store
+    except sqlite3.Error as e:
+        logger.error(f"共享存储打开失败，改用进程内缓存: {e}")
+        return None
+
+
+class RateCounter:
+    """
+    固定窗口计数限流
+    配置共享存储时所有 worker 共用一个计数，否则仅在本进程内计数
+    """
+
+    def __init__(self, name: str, limit: int, window: float, store: Optional[SharedStore] = None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.store = store
+        self._local: Dict[int, int] = {}
+
+    def hit(self) -> Tuple[bool, float]:
+        """计一次调用，返回 (是否允许, 距窗口重置的秒数)"""
+        now = time.time()
+        window_index = int(now // self.window)
+        reset_in = (window_index + 1) * self.window - now
+        if self.store is not None:
+            count = self.store.incr("rate", f"{self.name}:{window_index}", 1, ttl=self.window * 2)
+            if count is None:
+                # 共享存储繁忙：放行，不因计数失败拒绝请求
+                return True, reset_in
+        else:
+            if window_index not in self._local:
+                self._local = {window_index: 0}
+            self._local[window_index] += 1
+            count = self._local[window_index]
+        return count <= self.limit, reset_in
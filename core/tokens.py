@@ -0,0 +1,29 @@
+import math
+
+# 本地粗略估算 token 数（不依赖分词器、不访问网络），偏保守：
+# 中文等 CJK 字符约 0.7 token/字，其余字符约 3.5 字符/token
+CJK_TOKENS_PER_CHAR = 0.7
+OTHER_CHARS_PER_TOKEN = 3.5
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return (
+        0x2E80 <= code <= 0x9FFF      # CJK 部首、标点、统一汉字等
+        or 0xF900 <= code <= 0xFAFF   # CJK 兼容汉字
+        or 0xFF00 <= code <= 0xFFEF   # 全角字符
+    )
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的 token 数"""
+    if not text:
+        return 0
+    cjk = sum(1 for ch in text if _is_cjk(ch))
+    other = len(text) - cjk
+    return math.ceil(cjk * CJK_TOKENS_PER_CHAR + other / OTHER_CHARS_PER_TOKEN)
+
+
+def estimate_messages_tokens(messages: list) -> int:
+    """估算对话消息列表的 token 数（每条消息额外计入少量格式开销）"""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
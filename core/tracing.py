@@ -0,0 +1,273 @@
+import argparse
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from logging.handlers import QueueListener, RotatingFileHandler
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from config.settings import settings
+
+"""
+请求级链路追踪
+- 每个请求一个 trace，trace id 取自请求头（默认 X-Trace-Id），没有则生成，并在响应头返回
+- 代码中用 with span("名称") 标记耗时段，父子关系由 contextvar 自动维护（asyncio.gather 的子任务同样生效）
+- 按 TRACE_SAMPLE_RATE 采样（请求头 X-Trace-Sample: 1 可强制采样），采样的 trace 在请求结束后
+  经后台线程写入按大小轮转的 JSONL 文件；未采样时 span() 只做一次 contextvar 读取
+- 日志记录附带当前请求的 trace id（未采样的请求同样附带），可据此关联日志与 trace
+- 命令行查看耗时分布：python -m core.tracing logs/trace.jsonl
+"""
+
+FORCE_SAMPLE_HEADER = "x-trace-sample"
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    sampled: bool
+    start: float = field(default_factory=time.perf_counter)
+    wall_start: float = field(default_factory=time.time)
+    spans: List[dict] = field(default_factory=list)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_current_span: ContextVar[Optional[int]] = ContextVar("span", default=None)
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else None
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """记录一个耗时段；未采样时不做任何记录。产出的 span 可通过 set_attr 追加属性（未采样时为 None）"""
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        yield None
+        return
+
+    record = {
+        "id": len(trace.spans) + 1,
+        "parent": _current_span.get(),
+        "name": name,
+        "start_ms": round((time.perf_counter() - trace.start) * 1000, 3),
+        "attrs": attrs,
+    }
+    trace.spans.append(record)
+    token = _current_span.set(record["id"])
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = type(e).__name__
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        _current_span.reset(token)
+
+
+def start_span(name: str, **attrs) -> Optional[dict]:
+    """
+    手动开始一个 span（不改变当前父 span），用于跨越 yield 的异步生成器等场景，需配合 end_span
+    未采样时返回 None
+    """
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return None
+    record = {
+        "id": len(trace.spans) + 1,
+        "parent": _current_span.get(),
+        "name": name,
+        "start_ms": round((time.perf_counter() - trace.start) * 1000, 3),
+        "attrs": attrs,
+        "_start": time.perf_counter(),
+    }
+    trace.spans.append(record)
+    return record
+
+
+def end_span(record: Optional[dict], error: Optional[BaseException] = None):
+    if record is None or "_start" not in record:
+        return
+    record["duration_ms"] = round((time.perf_counter() - record.pop("_start")) * 1000, 3)
+    if error is not None:
+        record["error"] = type(error).__name__
+
+
+def set_attr(record: Optional[dict], key: str, value):
+    """给 span 追加属性（未采样时忽略）"""
+    if record is not None:
+        record["attrs"][key] = value
+
+
+class _TraceExporter:
+    """后台线程写入按大小轮转的 JSONL 文件，请求路径上只做入队"""
+
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        self.dropped = 0
+
+    def export(self, trace: Trace, root: dict):
+        # 去掉 start_span 记录的 _start 等内部字段（未结束的 span 仍带有这些字段）
+        spans = [{k: v for k, v in record.items() if not k.startswith("_")} for record in trace.spans]
+        line = json.dumps({
+            "trace_id": trace.trace_id,
+            "timestamp": round(trace.wall_start, 3),
+            **root,
+            "spans": spans,
+        }, ensure_ascii=False, separators=(",", ":"))
+        try:
+            self._queue.put_nowait(logging.makeLogRecord({"msg": line}))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self._listener.stop()
+
+
+_exporter: Optional[_TraceExporter] = None
+
+
+def _get_exporter() -> _TraceExporter:
+    global _exporter
+    if _exporter is None:
+        # 多 worker 时每个进程写各自的文件（文件名带进程号）
+        from config.logging_conf import worker_log_path
+        _exporter = _TraceExporter(
+            worker_log_path(settings.TRACE_FILE), settings.TRACE_FILE_MB * 1024 * 1024,
+            settings.TRACE_FILE_BACKUPS)
+    return _exporter
+
+
+def shutdown():
+    """停止后台写入线程（写完队列中剩余的 trace）"""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+        _exporter = None
+
+
+class TracingMiddleware:
+    """ASGI 中间件：建立请求级 trace，传递 trace id，请求结束后导出采样的 trace"""
+
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.TRACE_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        trace_id = headers.get(self.header, b"").decode("latin-1")[:64] or uuid.uuid4().hex
+        sampled = headers.get(FORCE_SAMPLE_HEADER.encode()) == b"1" or \
+            random.random() < settings.TRACE_SAMPLE_RATE
+        trace = Trace(trace_id, sampled)
+        token = _current_trace.set(trace)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + \
+                    [(self.header, trace_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_trace.reset(token)
+            if sampled:
+                route = scope.get("route")
+                _get_exporter().export(trace, {
+                    "name": f"{scope.get('method', '')} {getattr(route, 'path', scope.get('path', ''))}",
+                    "status": status["code"],
+                    "duration_ms": round((time.perf_counter() - trace.start) * 1000, 3),
+                })
+
+
+# ======================
+#  命令行：按 span 名称汇总耗时
+# ======================
+
+def _percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def summarize(paths: List[str], name_filter: Optional[str] = None) -> Dict[str, dict]:
+    """读取 trace 文件，按请求名称分组，统计各 span 的次数、平均/分位耗时及占请求总耗时的比例"""
+    groups: Dict[str, dict] = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    trace = json.loads(line)
+                except ValueError:
+                    continue
+                if name_filter and name_filter not in trace.get("name", ""):
+                    continue
+                group = groups.setdefault(trace["name"], {"durations": [], "spans": {}})
+                group["durations"].append(trace["duration_ms"])
+                for s in trace.get("spans", []):
+                    group["spans"].setdefault(s["name"], []).append(s.get("duration_ms", 0.0))
+    return groups
+
+
+def print_breakdown(groups: Dict[str, dict]):
+    for name, group in sorted(groups.items(), key=lambda g: -len(g[1]["durations"])):
+        durations = group["durations"]
+        total = sum(durations) or 1.0
+        print(f"\n{name}  请求数={len(durations)}  p50={_percentile(durations, 50):.1f}ms  "
+              f"p95={_percentile(durations, 95):.1f}ms  max={max(durations):.1f}ms")
+        print(f"  {'span':<28}{'次数':>8}{'平均ms':>10}{'p50ms':>10}{'p95ms':>10}{'占比':>8}")
+        for span_name, values in sorted(group["spans"].items(), key=lambda s: -sum(s[1])):
+            print(f"  {span_name:<28}{len(values):>8}{sum(values) / len(values):>10.1f}"
+                  f"{_percentile(values, 50):>10.1f}{_percentile(values, 95):>10.1f}"
+                  f"{sum(values) / total:>8.1%}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="按 span 汇总 trace 文件中的耗时分布")
+    parser.add_argument("files", nargs="*", default=[settings.TRACE_FILE])
+    parser.add_argument("--name", default=None, help="只统计名称包含该字符串的请求，如 /summary/generate")
+    parser.add_argument("--trace-id", default=None, help="打印单个 trace 的全部 span")
+    args = parser.parse_args(argv)
+
+    if args.trace_id:
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if args.trace_id in line:
+                        trace = json.loads(line)
+                        print(f"{trace['name']}  {trace['duration_ms']}ms  status={trace['status']}")
+                        depth = {}
+                        for s in trace["spans"]:
+                            depth[s["id"]] = depth.get(s["parent"], 0) + 1
+                            print(f"{'  ' * depth[s['id']]}{s['name']:<30} +{s['start_ms']:>9.1f}ms "
+                                  f"{s.get('duration_ms', 0):>9.1f}ms {s.get('attrs', '')}")
+                        return
+        print("未找到该 trace", file=sys.stderr)
+        return
+
+    print_breakdown(summarize(args.files, args.name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import asyncio
+import importlib
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from loguru import logger
+
+from config.settings import settings
+
+"""
+启动预热
+- 应用启动后在后台执行，不阻塞 worker 开始接收请求
+- 在线程中导入较慢的依赖（openai），创建各大模型后端客户端
+- 并行解析域名并预先建立到大模型后端与百度上游的连接（含 TLS 握手），连接留在共享连接池中供首个请求复用
+- /ready 在预热完成前返回 503，完成后返回各步骤耗时及各上游是否可达
+"""
+
+# 在后台线程中预先导入的依赖
+HEAVY_IMPORTS = ("openai",)
+
+
+class Warmup:
+    def __init__(self):
+        self.started_at = time.time()
+        self.finished = not settings.WARMUP_ENABLED
+        self.duration_ms: Optional[float] = None
+        self.steps: Dict[str, float] = {}
+        self.upstreams: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.finished
+
+    def start(self, state):
+        """在后台启动预热（WARMUP_ENABLED=False 时直接视为就绪）"""
+        if settings.WARMUP_ENABLED:
+            self._task = asyncio.create_task(self.run(state))
+
+    async def aclose(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    @contextmanager
+    def _step(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[name] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def run(self, state):
+        start = time.perf_counter()
+        try:
+            # 1. 较慢的依赖在线程中导入，期间事件循环照常处理请求
+            with self._step("imports"):
+                for module in HEAVY_IMPORTS:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, importlib.import_module, module)
+
+            # 2. 创建各后端客户端（提示词模板已在生成器初始化时构建）
+            backends = state.generator.router.backends
+            with self._step("llm_clients"):
+                for backend in backends:
+                    backend.client
+
+            # 3. 并行解析域名并建立连接
+            with self._step("upstreams"):
+                checks = [self._check_llm(backend) for backend in backends]
+                checks += [self._check_baidu(state.baidu_pool, name, url) for name, url in _baidu_checks()]
+                await asyncio.gather(*checks)
+        except Exception as e:
+            logger.error(f"启动预热失败: {e}", exc_info=True)
+        finally:
+            self.duration_ms = round((time.perf_counter() - start) * 1000, 1)
+            self.finished = True
+            unreachable = [name for name, r in self.upstreams.items() if not r["reachable"]]
+            logger.info(f"启动预热完成，耗时 {self.duration_ms}ms，不可达上游: {unreachable or '无'}")
+
+    async def _check_llm(self, backend):
+        """向 /models 发一次请求：收到任何 HTTP 响应（含 401/404）即说明连接已建立"""
+        from openai import APIStatusError
+
+        result = self._new_result(f"llm:{backend.name}", backend.base_url)
+        if not await self._resolve(result, backend.base_url):
+            return
+        start = time.perf_counter()
+        try:
+            client = backend.client.with_options(max_retries=0, timeout=settings.WARMUP_TIMEOUT)
+            await client.models.list()
+            result.update(reachable=True, status=200)
+        except APIStatusError as e:
+            result.update(reachable=True, status=e.status_code)
+        except Exception as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["connect_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def _check_baidu(self, pool, name: str, url: str):
+        """向百度上游发一次 HEAD 请求，连接保留在共享连接池中"""
+        result = self._new_result(name, url)
+        if not await self._resolve(result, url):
+            return
+        start = time.perf_counter()
+        try:
+            resp = await pool.client.head(url, timeout=settings.WARMUP_TIMEOUT)
+            result.update(reachable=True, status=resp.status_code)
+        except httpx.HTTPError as e:
+            result["error"] = f"{type(e).__name__}: {e}"
+        result["connect_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def _new_result(self, name: str, url: str) -> dict:
+        """按检查项名称记录结果（不同检查项可能指向同一域名，不能按域名区分）"""
+        result = {"url": url, "reachable": False, "status": None,
+                  "dns_ms": None, "connect_ms": None, "error": None}
+        self.upstreams[name] = result
+        return result
+
+    async def _resolve(self, result: dict, url: str) -> bool:
+        """预先解析域名（系统 DNS 缓存随之预热），解析失败时记录错误并跳过连接"""
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                asyncio.get_running_loop().getaddrinfo(parts.hostname, port),
+                timeout=settings.WARMUP_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            result["error"] = f"DNS 解析失败: {type(e).__name__}: {e}"
+            return False
+        finally:
+            result["dns_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return True
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmup_enabled": settings.WARMUP_ENABLED,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "warmup_ms": self.duration_ms,
+            "steps_ms": self.steps,
+            "upstreams": self.upstreams,
+        }
+
+
+def _baidu_checks() -> List[Tuple[str, str]]:
+    """
+    需要预连接的百度上游 (检查项名称, 地址)：
+    全景图接口（panorama）、代理上游覆盖地址（baidu_proxy）及额外配置的地图资源域名（以域名为名称）
+    """
+    checks = [("panorama", settings.PANORAMA_API_URL)]
+    if settings.BAIDU_PROXY_UPSTREAM:
+        checks.append(("baidu_proxy", settings.BAIDU_PROXY_UPSTREAM))
+    for host in settings.WARMUP_BAIDU_HOSTS:
+        # 与代理转发一致：api.map.baidu.com 走 https，其余资源域名走 http
+        scheme = "https" if host == "api.map.baidu.com" else "http"
+        checks.append((host, f"{scheme}://{host}/"))
+    return checks
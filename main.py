@@ -1,13 +1,64 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
 from config.settings import settings
 from loguru import logger
+from core.generator import EmergencySummaryGenerator
+from core.session import SummarySessionStore
+from core.coalescer import QACoalescer
+from core.result_cache import SummaryResultCache
+from core.http_pool import BaiduHttpPool
+from core.proxy_cache import ProxyCache
+from core.panorama_cache import PanoramaCache
+from core.panorama_prefetch import PanoramaPrefetcher
+from core.shared_store import open_shared_store
+from core.warmup import Warmup
+from core.metrics import MetricsMiddleware, register_state_metrics, registry
+from core import tracing
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("开始启动指引总结生成器")
+    # 多 worker 共享存储（未配置时为 None，各对象退回进程内缓存）
+    app.state.shared_store = open_shared_store(settings.SHARED_STORE_PATH)
+    # 全局共享的生成器（内含大模型客户端连接池）
+    app.state.generator = EmergencySummaryGenerator(store=app.state.shared_store)
+    # 完整总结结果缓存（含并发请求合并）
+    app.state.result_cache = SummaryResultCache(
+        app.state.shared_store) if settings.SUMMARY_CACHE_ENABLED else None
+    # 增量总结会话存储
+    app.state.session_store = SummarySessionStore(app.state.shared_store)
+    # 增量问答合并器（可选）
+    app.state.coalescer = QACoalescer(
+        settings.INCREMENTAL_COALESCE_WINDOW_MS / 1000,
+        settings.INCREMENTAL_COALESCE_MAX_PAIRS
+    ) if settings.INCREMENTAL_COALESCE_WINDOW_MS > 0 else None
+    # 百度地图上游共享连接池（代理与全景图共用）
+    app.state.baidu_pool = BaiduHttpPool()
+    # 百度地图静态资源两级缓存
+    app.state.proxy_cache = ProxyCache() if settings.PROXY_CACHE_ENABLED else None
+    # 全景图缓存（含并发请求合并）
+    app.state.panorama_cache = PanoramaCache() if settings.PANORAMA_CACHE_ENABLED else None
+    # 全景图邻近视角预取（可选，预取结果写入全景图缓存）
+    app.state.panorama_prefetcher = PanoramaPrefetcher(
+        app.state.panorama_cache, app.state.shared_store
+    ) if settings.PANORAMA_PREFETCH_ENABLED and app.state.panorama_cache is not None else None
+    # 缓存命中、排队深度等指标在抓取 /metrics 时从上述共享对象读取
+    if settings.METRICS_ENABLED:
+        register_state_metrics(app.state)
+    # 后台预热依赖与上游连接，完成前 /ready 返回 503
+    app.state.warmup = Warmup()
+    app.state.warmup.start(app.state)
     yield
+    await app.state.warmup.aclose()
+    if app.state.panorama_prefetcher is not None:
+        await app.state.panorama_prefetcher.aclose()
+    await app.state.generator.aclose()
+    await app.state.baidu_pool.aclose()
+    if app.state.shared_store is not None:
+        app.state.shared_store.close()
+    tracing.shutdown()
     logger.info("关闭指引总结生成器")
 
 
@@ -21,6 +72,11 @@ def create_app() -> FastAPI:
         redirect_slashes=False  # 关闭自动重定向
     )
 
+    if settings.METRICS_ENABLED:
+        app.add_middleware(MetricsMiddleware)
+    # 最外层：trace 覆盖整个请求（含指标统计与响应序列化）
+    app.add_middleware(tracing.TracingMiddleware)
+
     # summary 路由
     from routers.summary import router as summary_router
     app.include_router(summary_router, prefix=settings.API_PREFIX)
@@ -46,6 +102,18 @@ def create_app() -> FastAPI:
     async def health_check():
         return {"status": "healthy"}
 
+    # 就绪探针：启动预热完成后返回 200，附预热耗时与各上游可达情况
+    @app.get("/ready")
+    async def readiness_check(request: Request):
+        warmup = request.app.state.warmup
+        return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
+
+    # Prometheus 指标（METRICS_ENABLED=False 时不注册）
+    if settings.METRICS_ENABLED:
+        @app.get("/metrics", include_in_schema=False)
+        async def prometheus_metrics():
+            return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
     return app
 
 
@@ -55,5 +123,6 @@ app = create_app()
 if __name__ == "__main__":
     import uvicorn
     # logger.info("=== 通过 python main.py 启动 ===")
+    # 开发模式（热重载）；生产环境使用 python serve.py 启动多 worker
     # 用 "main:app" 形式配合 --reload 更稳（热重载子进程也会正确 import）
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,7 +1,22 @@
 from fastapi import APIRouter, HTTPException, Query, Depends, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse
 from config.logging_conf import logger
 from config.settings import settings
+from core.http_pool import BaiduHttpPool
+from core.proxy_cache import ProxyCache, CachedResource, make_cache_key
+from core.compression import (GzipEncoder, SUPPORTED_ENCODINGS, accepted_encodings,
+                              decode_body, gzip_body, is_compressible)
+from core.panorama_cache import PanoramaCache, PanoramaImage, panorama_cache_key
+from core.panorama_prefetch import PanoramaPrefetcher
+from core.panorama_sprite import build_sprite, sprite_available
+from core.tracing import set_attr, span
+from contextlib import AsyncExitStack
+import asyncio
+import base64
+import json
+import uuid
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncIterator, List, Optional, Set, Tuple
 import httpx
 
 
@@ -20,6 +35,26 @@ def get_baidu_ak():
     return baidu_ak
 
 
+def get_baidu_pool(request: Request) -> BaiduHttpPool:
+    """获取应用生命周期内共享的百度上游连接池"""
+    return request.app.state.baidu_pool
+
+
+def get_proxy_cache(request: Request) -> Optional[ProxyCache]:
+    """获取百度地图资源缓存（未启用时为 None）"""
+    return request.app.state.proxy_cache
+
+
+def get_panorama_cache(request: Request) -> Optional[PanoramaCache]:
+    """获取全景图缓存（未启用时为 None）"""
+    return request.app.state.panorama_cache
+
+
+def get_panorama_prefetcher(request: Request) -> Optional[PanoramaPrefetcher]:
+    """获取全景图邻近视角预取器（未启用时为 None）"""
+    return request.app.state.panorama_prefetcher
+
+
 # ======================
 #  通用代理：代理所有百度地图相关资源
 # ======================
@@ -50,7 +85,12 @@ BAIDU_MAP_DOMAINS = {
 
 
 @router.get("/baidu-proxy/{path:path}")
-async def proxy_baidu_resources(path: str, request: Request):
+async def proxy_baidu_resources(
+    path: str,
+    request: Request,
+    pool: BaiduHttpPool = Depends(get_baidu_pool),
+    cache: Optional[ProxyCache] = Depends(get_proxy_cache)
+):
     """
     通用代理：代理所有百度地图相关资源
     使用方式：?host=目标域名&其他参数
@@ -58,8 +98,12 @@ async def proxy_baidu_resources(path: str, request: Request):
         /baidu-proxy/api?host=api.map.baidu.com&v=3.0&ak=xxx
         /baidu-proxy/getscript?host=api.map.baidu.com&...
         /baidu-proxy/tile?host=apimaponline1.bdimg.com&...
+    上游压缩内容在浏览器支持该编码时原样转发；未压缩的文本资源压缩后转发
     """
     query_params = dict(request.query_params)
+    # 浏览器接受的压缩编码（关闭代理压缩时视为都不接受，一律解压后转发）
+    accepted = accepted_encodings(request.headers.get(
+        "accept-encoding", "")) if settings.PROXY_COMPRESSION else set()
     target_host = query_params.pop("host", None)
 
     if not target_host:
@@ -69,9 +113,12 @@ async def proxy_baidu_resources(path: str, request: Request):
         logger.error(f"拒绝代理非法域名: {target_host}")
         raise HTTPException(status_code=403, detail="拒绝代理非法域名")
 
-    # 构建目标 URL
-    scheme = "https" if target_host == "api.map.baidu.com" else "http"
-    target_url = f"{scheme}://{target_host}/{path.lstrip('/')}"
+    # 构建目标 URL（配置了 BAIDU_PROXY_UPSTREAM 时统一转发到该地址，用于压测/联调）
+    if settings.BAIDU_PROXY_UPSTREAM:
+        target_url = f"{settings.BAIDU_PROXY_UPSTREAM.rstrip('/')}/{path.lstrip('/')}"
+    else:
+        scheme = "https" if target_host == "api.map.baidu.com" else "http"
+        target_url = f"{scheme}://{target_host}/{path.lstrip('/')}"
 
     # 请求头
     headers = {
@@ -80,63 +127,201 @@ async def proxy_baidu_resources(path: str, request: Request):
         "Accept": "*/*",
         "Accept-Encoding": "gzip, deflate",
         "Accept-Language": "zh-CN,zh;q=0.9,en;q=0.8",
-        "Connection": "keep-alive",
         "Referer": "https://www.baidu.com/" if target_host == "api.map.baidu.com" else f"http://{target_host}/",
     }
 
-    async with httpx.AsyncClient(verify=False, timeout=30.0) as client:
+    # 查缓存：新鲜则直接返回，过期则带上 ETag / Last-Modified 重新验证
+    cache_key = make_cache_key(target_host, path, query_params) if cache else None
+    with span("proxy.cache_lookup"):
+        cached = await cache.get(cache_key) if cache else None
+    if cached is not None:
+        if cached.fresh:
+            cache.record("hits")
+            return _cached_response(cached, "HIT", accepted)
+        headers.update(cached.validators)
+
+    # 上游连接在流式转发结束（或浏览器断开）时才释放
+    stack = AsyncExitStack()
+    try:
+        resp = await stack.enter_async_context(pool.stream(
+            target_url,
+            params=query_params,
+            headers=headers,
+            follow_redirects=True
+        ))
+
+        if cached is not None and resp.status_code == 304:
+            await stack.aclose()
+            cache.record("revalidated")
+            await cache.put(cache_key, cache.refresh(cached, resp.headers))
+            return _cached_response(cached, "REVALIDATED", accepted)
+
+        # 选择转发方式：原样转发压缩内容 / 解压 / 压缩未压缩的文本
+        chunk_size = settings.PROXY_STREAM_CHUNK_KB * 1024
+        upstream_encoding = resp.headers.get("content-encoding", "").strip().lower()
+        content_length = resp.headers.get("content-length")
+        encoder = None
+        if upstream_encoding in SUPPORTED_ENCODINGS and upstream_encoding in accepted:
+            chunks = resp.aiter_raw(chunk_size)
+            response_encoding = upstream_encoding
+        else:
+            chunks = resp.aiter_bytes(chunk_size)
+            response_encoding = None
+            if not upstream_encoding and "gzip" in accepted and is_compressible(
+                    resp.headers.get("content-type", ""),
+                    int(content_length) if content_length and content_length.isdigit() else None):
+                encoder = GzipEncoder()
+                response_encoding = "gzip"
+
+        # 读取第一块内容，用于判断上游是否返回空内容
         try:
-            resp = await client.get(
-                target_url,
-                params=query_params,
-                headers=headers,
-                follow_redirects=True
-            )
-
-            # 确保 content 被读取
-            content = resp.content  # 触发下载
-
-            if not content:
-                logger.warning(f"从 {target_url} 获取到空内容")
-                return Response(
-                    content="console.error('Empty response from upstream')",
-                    status_code=502,
-                    media_type="application/javascript"
-                )
-
-            # 删除 Content-Length，让 FastAPI 自动计算
-            headers_to_send = {
-                key: value for key, value in resp.headers.items()
-                if key.lower() not in ["content-length", "connection", "transfer-encoding", "content-encoding"]
-            }
-
-            # 显式指定 media_type
-            media_type = resp.headers.get(
-                "content-type", "application/javascript")
+            first_chunk = await chunks.__anext__()
+        except StopAsyncIteration:
+            first_chunk = b""
 
+        if not first_chunk:
+            await stack.aclose()
+            logger.warning(f"从 {target_url} 获取到空内容")
             return Response(
-                content=content,
+                content="console.error('Empty response from upstream')",
+                status_code=502,
+                media_type="application/javascript"
+            )
+
+        # 删除 Content-Length，让 FastAPI 自动计算
+        headers_to_send = {
+            key: value for key, value in resp.headers.items()
+            if key.lower() not in ["content-length", "connection", "transfer-encoding", "content-encoding", "vary"]
+        }
+        if response_encoding:
+            headers_to_send["Content-Encoding"] = response_encoding
+        headers_to_send["Vary"] = "Accept-Encoding"
+
+        # 显式指定 media_type
+        media_type = resp.headers.get(
+            "content-type", "application/javascript")
+
+        if cache:
+            cache.record("misses")
+            headers_to_send["X-Cache"] = "MISS"
+
+        body = _relay_upstream(stack, resp, first_chunk, chunks, encoder,
+                               response_encoding, cache, cache_key, target_url)
+        if settings.PROXY_STREAMING:
+            return StreamingResponse(
+                body,
                 status_code=resp.status_code,
                 headers=headers_to_send,
                 media_type=media_type
             )
-        except httpx.TimeoutException:
-            logger.error(f"请求超时: {target_url}")
-            return Response(content="console.error('Request timeout')", status_code=504, media_type="application/javascript")
-        except httpx.RequestError as e:
-            logger.error(f"请求失败 {target_url}: {e}")
-            return Response(content="console.error('Request failed')", status_code=502, media_type="application/javascript")
-        except Exception as e:
-            logger.error(f"代理失败 {target_url}: {e}", exc_info=True)
-            return Response(content="console.error('Proxy internal error')", status_code=500, media_type="application/javascript")
-
-        except Exception as e:
-            logger.error(f"代理失败 {target_url}: {e}")
-            return Response(
-                content="console.error('Failed to load resource')",
-                status_code=500,
-                media_type="application/javascript"
-            )
+
+        return Response(
+            content=b"".join([chunk async for chunk in body]),
+            status_code=resp.status_code,
+            headers=headers_to_send,
+            media_type=media_type
+        )
+    except httpx.TimeoutException:
+        await stack.aclose()
+        logger.error(f"请求超时: {target_url}")
+        if cached is not None:
+            return _cached_response(cached, "STALE", accepted)
+        return Response(content="console.error('Request timeout')", status_code=504, media_type="application/javascript")
+    except httpx.RequestError as e:
+        await stack.aclose()
+        logger.error(f"请求失败 {target_url}: {e}")
+        if cached is not None:
+            return _cached_response(cached, "STALE", accepted)
+        return Response(content="console.error('Request failed')", status_code=502, media_type="application/javascript")
+    except Exception as e:
+        await stack.aclose()
+        logger.error(f"代理失败 {target_url}: {e}", exc_info=True)
+        return Response(content="console.error('Proxy internal error')", status_code=500, media_type="application/javascript")
+
+
+async def _relay_upstream(
+    stack: AsyncExitStack,
+    resp: httpx.Response,
+    first_chunk: bytes,
+    chunks: AsyncIterator[bytes],
+    encoder: Optional[GzipEncoder],
+    encoding: Optional[str],
+    cache: Optional[ProxyCache],
+    cache_key: Optional[str],
+    target_url: str
+) -> AsyncIterator[bytes]:
+    """
+    逐块转发上游内容（传入 encoder 时边压缩边转发），同时在不超过单条缓存上限时收集
+    实际发送的内容（编码为 encoding）写入缓存
+    浏览器断开时生成器被取消，finally 中关闭上游连接
+    """
+    collected = [] if cache else None
+    size = 0
+    completed = False
+
+    def collect(data: bytes):
+        nonlocal collected, size
+        if collected is not None:
+            size += len(data)
+            if size <= cache.max_entry_bytes:
+                collected.append(data)
+            else:
+                collected = None
+
+    try:
+        chunk = first_chunk
+        while True:
+            if encoder is not None:
+                chunk = encoder.compress(chunk)
+            collect(chunk)
+            yield chunk
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                break
+        if encoder is not None:
+            tail = encoder.finish()
+            collect(tail)
+            yield tail
+        completed = True
+    except httpx.HTTPError as e:
+        logger.warning(f"上游传输中断 {target_url}: {e}")
+    finally:
+        await stack.aclose()
+
+    # 仅完整转发的内容才写入缓存；未压缩的文本资源压缩后再缓存
+    if completed and collected is not None:
+        body = b"".join(collected)
+        if encoding is None and settings.PROXY_COMPRESSION and \
+                is_compressible(resp.headers.get("content-type", ""), len(body)):
+            body = await run_in_threadpool(gzip_body, body)
+            encoding = "gzip"
+        entry = cache.build_entry(
+            body, resp.status_code, resp.headers, encoding)
+        if entry is not None:
+            await cache.put(cache_key, entry)
+
+
+def _cached_response(entry: CachedResource, cache_status: str, accepted: Set[str]) -> Response:
+    """
+    由缓存条目构建响应，X-Cache 标记命中情况（HIT / REVALIDATED / STALE）
+    缓存内容已压缩而浏览器不接受该编码时解压后返回
+    """
+    headers = {k: v for k, v in entry.headers.items() if k not in ("content-type", "content-encoding")}
+    headers["X-Cache"] = cache_status
+    headers["Vary"] = "Accept-Encoding"
+    body = entry.body
+    encoding = entry.headers.get("content-encoding")
+    if encoding in accepted:
+        headers["Content-Encoding"] = encoding
+    elif encoding:
+        body = decode_body(body, encoding)
+    return Response(
+        content=body,
+        status_code=entry.status_code,
+        headers=headers,
+        media_type=entry.headers.get("content-type", "application/javascript")
+    )
 
 
 # ======================
@@ -145,6 +330,7 @@ async def proxy_baidu_resources(path: str, request: Request):
 
 @router.get("")
 async def get_panorama(
+    response: Response,
     location: str = Query(..., description="经纬度坐标，格式为'经度,纬度'"),
     width: int = Query(512, description="图片宽度，范围[10,1024]", ge=10, le=1024),
     height: int = Query(256, description="图片高度，范围[10,512]", ge=10, le=512),
@@ -153,11 +339,15 @@ async def get_panorama(
     pitch: int = Query(0, description="垂直视角，范围[0,90]", ge=0, le=90),
     coordtype: str = Query("bd09ll", description="坐标类型，bd09ll或wgs84ll"),
     return_type: str = Query("image", description="返回类型，image或json"),
-    baidu_ak: str = Depends(get_baidu_ak)
+    baidu_ak: str = Depends(get_baidu_ak),
+    pool: BaiduHttpPool = Depends(get_baidu_pool),
+    panorama_cache: Optional[PanoramaCache] = Depends(get_panorama_cache),
+    prefetcher: Optional[PanoramaPrefetcher] = Depends(get_panorama_prefetcher)
 ):
     """
     获取百度全景图中转接口
     参数说明：见文档
+    开启预取时，返回后在后台预取同一位置的相邻视角
     """
     try:
         if coordtype not in ['bd09ll', 'wgs84ll']:
@@ -175,67 +365,278 @@ async def get_panorama(
             'coordtype': coordtype
         }
 
-        logger.info(f"请求百度全景图API，参数: {params}")
+        image, cache_status = await _load_panorama(pool, panorama_cache, params)
+
+        if prefetcher is not None:
+            prefetcher.schedule(params, lambda view: _fetch_panorama(pool, view))
+
+        if return_type == 'json':
+            if cache_status:
+                response.headers["X-Cache"] = cache_status
+            return {
+                'url': f"{PANORAMA_API_URL}?{'&'.join([f'{k}={v}' for k, v in params.items()])}",
+                'location': location,
+                'width': width,
+                'height': height,
+                'fov': fov,
+                'heading': heading,
+                'pitch': pitch,
+                'coordtype': coordtype
+            }
 
         headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        }
+            "Content-Disposition": f"inline; filename=panorama_{location.replace(',', '_')}.jpg"}
+        if cache_status:
+            headers["X-Cache"] = cache_status
+        return Response(
+            content=image.content,
+            media_type=image.content_type,
+            headers=headers
+        )
 
-        async with httpx.AsyncClient(verify=False, timeout=10.0) as client:
-            resp = await client.get(PANORAMA_API_URL, params=params, headers=headers, follow_redirects=True)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("处理请求时发生异常")
+        raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
 
-        logger.info(f"百度全景图API响应状态: {resp.status_code}")
 
-        if resp.status_code != 200:
-            error_info = resp.text
-            logger.error(f"百度API返回错误: {error_info}")
-            raise HTTPException(
-                status_code=500, detail=f"百度API请求失败: {error_info}")
+# ======================
+#  多视角全景图：一次请求获取同一位置的多个 heading
+# ======================
 
-        content_type = resp.headers.get('Content-Type', '')
+MULTI_FORMATS = ("json", "multipart", "sprite")
 
-        if 'application/json' in content_type:
-            error_data = resp.json()
-            logger.error(f"百度API返回JSON错误: {error_data}")
-            raise HTTPException(
-                status_code=500, detail=f"百度API返回错误: {error_data}")
-
-        if 'text/html' in content_type:
-            logger.error(f"收到HTML响应，可能是反爬或错误页：\n{resp.text[:500]}")
-            raise HTTPException(status_code=500, detail="百度API返回HTML错误页")
-
-        if 'image' in content_type:
-            if return_type == 'json':
-                return {
-                    'url': f"{PANORAMA_API_URL}?{'&'.join([f'{k}={v}' for k, v in params.items()])}",
-                    'location': location,
-                    'width': width,
-                    'height': height,
-                    'fov': fov,
-                    'heading': heading,
-                    'pitch': pitch,
-                    'coordtype': coordtype
-                }
-            else:
-                return Response(
-                    content=resp.content,
-                    media_type=content_type,
-                    headers={
-                        "Content-Disposition": f"inline; filename=panorama_{location.replace(',', '_')}.jpg"}
-                )
+
+def _parse_headings(headings: str) -> List[int]:
+    """解析逗号分隔的 heading 列表（去重并保持顺序），非法时抛出 400"""
+    try:
+        values = [int(v) for v in headings.split(",") if v.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="headings 须为逗号分隔的整数，如 0,90,180,270")
+    values = list(dict.fromkeys(values))
+    if not values:
+        raise HTTPException(status_code=400, detail="headings 不能为空")
+    if len(values) > settings.PANORAMA_MULTI_MAX_VIEWS:
+        raise HTTPException(
+            status_code=400, detail=f"单次最多 {settings.PANORAMA_MULTI_MAX_VIEWS} 个视角")
+    if any(v < 0 or v > 360 for v in values):
+        raise HTTPException(status_code=400, detail="heading 范围为[0,360]")
+    return values
+
+
+@router.get("/multi")
+async def get_panorama_multi(
+    location: str = Query(..., description="经纬度坐标，格式为'经度,纬度'"),
+    headings: str = Query("0,90,180,270", description="水平视角列表，逗号分隔，每个范围[0,360]"),
+    width: int = Query(512, description="单张图片宽度，范围[10,1024]", ge=10, le=1024),
+    height: int = Query(256, description="单张图片高度，范围[10,512]", ge=10, le=512),
+    fov: int = Query(90, description="水平方向范围，范围[10,360]", ge=10, le=360),
+    pitch: int = Query(0, description="垂直视角，范围[0,90]", ge=0, le=90),
+    coordtype: str = Query("bd09ll", description="坐标类型，bd09ll或wgs84ll"),
+    format: str = Query("json", description="返回格式：json、multipart 或 sprite（拼接长图，需安装 Pillow）"),
+    baidu_ak: str = Depends(get_baidu_ak),
+    pool: BaiduHttpPool = Depends(get_baidu_pool),
+    panorama_cache: Optional[PanoramaCache] = Depends(get_panorama_cache)
+):
+    """
+    多视角全景图：同一位置的多个 heading 并发获取（经全景图缓存与共享连接池），一次返回
+    - json：views 列表，成功的视角含 base64 图片，失败的视角含错误信息
+    - multipart：multipart/mixed，每个视角一个部分（失败的视角为 JSON 错误），部分头 X-Heading / X-Cache
+    - sprite：按 headings 顺序横向拼接的 JPEG（第 i 张位于 x=i*width，失败的视角灰色填充），
+      各视角结果见响应头 X-Panorama-Views
+    全部视角失败时返回 502（json 格式）
+    """
+    if coordtype not in ['bd09ll', 'wgs84ll']:
+        raise HTTPException(status_code=400, detail="coordtype参数只能是bd09ll或wgs84ll")
+    if format not in MULTI_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format 只能是 {'、'.join(MULTI_FORMATS)}")
+    if format == "sprite" and not sprite_available():
+        raise HTTPException(status_code=501, detail="未安装 Pillow，不支持 sprite 格式")
+    heading_list = _parse_headings(headings)
+
+    base_params = {
+        'ak': baidu_ak,
+        'location': location,
+        'width': width,
+        'height': height,
+        'fov': fov,
+        'pitch': pitch,
+        'coordtype': coordtype
+    }
+    results = await asyncio.gather(*(
+        _load_panorama(pool, panorama_cache, {**base_params, 'heading': heading})
+        for heading in heading_list
+    ), return_exceptions=True)
+
+    views = []
+    for heading, result in zip(heading_list, results):
+        if isinstance(result, BaseException):
+            detail = result.detail if isinstance(result, HTTPException) else str(result)
+            logger.warning(f"多视角全景图获取失败, 位置={location}, heading={heading}: {detail}")
+            views.append({"heading": heading, "status": "error", "error": detail, "image": None})
         else:
-            logger.error(f"未知的返回类型: {content_type}")
-            raise HTTPException(
-                status_code=500, detail=f"未知的返回类型: {content_type}")
+            image, cache_status = result
+            views.append({"heading": heading, "status": "ok", "cache": cache_status, "image": image})
+
+    if format == "json" or all(v["status"] == "error" for v in views):
+        return _multi_json_response(location, views)
+    if format == "multipart":
+        return _multi_multipart_response(location, views)
+
+    sprite = await run_in_threadpool(
+        build_sprite, [v["image"].content if v["image"] else None for v in views], width, height)
+    summary = [
+        {"heading": v["heading"], "status": v["status"], "x": i * width}
+        for i, v in enumerate(views)
+    ]
+    return Response(
+        content=sprite,
+        media_type="image/jpeg",
+        headers={
+            "Content-Disposition": f"inline; filename=panorama_{location.replace(',', '_')}_sprite.jpg",
+            "X-Panorama-Views": json.dumps(summary, separators=(",", ":")),
+        }
+    )
+
+
+def _multi_json_response(location: str, views: List[dict]) -> Response:
+    """json 格式：图片以 base64 编码；全部视角失败时状态码为 502"""
+    body = {
+        "location": location,
+        "views": [
+            {
+                "heading": v["heading"],
+                "status": v["status"],
+                "cache": v.get("cache"),
+                "content_type": v["image"].content_type,
+                "image_base64": base64.b64encode(v["image"].content).decode("ascii"),
+            } if v["image"] else
+            {"heading": v["heading"], "status": v["status"], "error": v["error"]}
+            for v in views
+        ],
+    }
+    all_failed = all(v["status"] == "error" for v in views)
+    return Response(
+        content=json.dumps(body, ensure_ascii=False),
+        status_code=502 if all_failed else 200,
+        media_type="application/json"
+    )
+
+
+def _multi_multipart_response(location: str, views: List[dict]) -> Response:
+    """multipart/mixed 格式：每个视角一个部分，失败的视角为 JSON 错误"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for v in views:
+        if v["image"]:
+            headers = [
+                f"Content-Type: {v['image'].content_type}",
+                f"Content-Disposition: inline; filename=panorama_{location.replace(',', '_')}_{v['heading']}.jpg",
+            ]
+            content = v["image"].content
+        else:
+            headers = ["Content-Type: application/json"]
+            content = json.dumps({"heading": v["heading"], "error": v["error"]}, ensure_ascii=False).encode("utf-8")
+        headers.append(f"X-Heading: {v['heading']}")
+        if v.get("cache"):
+            headers.append(f"X-Cache: {v['cache']}")
+        part_headers = "".join(f"{h}\r\n" for h in headers)
+        parts.append(f"--{boundary}\r\n{part_headers}\r\n".encode("utf-8"))
+        parts.append(content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return Response(content=b"".join(parts), media_type=f"multipart/mixed; boundary={boundary}")
+
+
+async def _load_panorama(
+    pool: BaiduHttpPool,
+    panorama_cache: Optional[PanoramaCache],
+    params: dict
+) -> Tuple[PanoramaImage, Optional[str]]:
+    """获取一张全景图，返回 (图片, 缓存状态)；未启用缓存时直接请求百度，缓存状态为 None"""
+    if panorama_cache is None:
+        return await _fetch_panorama(pool, params), None
+
+    # 相同位置与视角的图片走缓存，并发的相同请求只请求一次百度
+    cache_key = panorama_cache_key(
+        params["location"], params["width"], params["height"], params["fov"],
+        params["heading"], params["pitch"], params["coordtype"])
+    with span("panorama.cache", heading=params["heading"]) as s:
+        image, cache_status = await panorama_cache.get_or_load(
+            cache_key, lambda: _fetch_panorama(pool, params))
+        set_attr(s, "status", cache_status)
+    return image, cache_status
+
+
+async def _fetch_panorama(pool: BaiduHttpPool, params: dict) -> PanoramaImage:
+    """请求百度全景图API，仅在返回图片时成功，其余情况抛出 HTTPException"""
+    logger.info(f"请求百度全景图API，参数: {params}")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.exception("处理请求时发生异常")
-        raise HTTPException(status_code=500, detail=f"服务器内部错误: {str(e)}")
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    }
+
+    resp = await pool.get(PANORAMA_API_URL, timeout=10.0, params=params, headers=headers, follow_redirects=True)
+
+    logger.info(f"百度全景图API响应状态: {resp.status_code}")
+
+    if resp.status_code != 200:
+        error_info = resp.text
+        logger.error(f"百度API返回错误: {error_info}")
+        raise HTTPException(
+            status_code=500, detail=f"百度API请求失败: {error_info}")
+
+    content_type = resp.headers.get('Content-Type', '')
+
+    if 'application/json' in content_type:
+        error_data = resp.json()
+        logger.error(f"百度API返回JSON错误: {error_data}")
+        raise HTTPException(
+            status_code=500, detail=f"百度API返回错误: {error_data}")
+
+    if 'text/html' in content_type:
+        logger.error(f"收到HTML响应，可能是反爬或错误页：\n{resp.text[:500]}")
+        raise HTTPException(status_code=500, detail="百度API返回HTML错误页")
+
+    if 'image' not in content_type:
+        logger.error(f"未知的返回类型: {content_type}")
+        raise HTTPException(
+            status_code=500, detail=f"未知的返回类型: {content_type}")
+
+    return PanoramaImage(content=resp.content, content_type=content_type)
 
 
 @router.get("/health")
 async def panorama_health_check():
     """全景图服务健康检查"""
     return {"status": "healthy", "service": "baidu-panorama"}
+
+
+@router.get("/pool-stats")
+async def panorama_pool_stats(pool: BaiduHttpPool = Depends(get_baidu_pool)):
+    """百度上游连接池统计，用于评估连接池大小"""
+    return pool.stats()
+
+
+@router.get("/cache-stats")
+async def panorama_cache_stats(cache: Optional[ProxyCache] = Depends(get_proxy_cache)):
+    """百度地图资源缓存统计（命中率、内存与磁盘占用）"""
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+
+@router.get("/panorama-cache-stats")
+async def panorama_image_cache_stats(panorama_cache: Optional[PanoramaCache] = Depends(get_panorama_cache)):
+    """全景图缓存统计（命中率、合并请求数、内存占用）"""
+    if panorama_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **panorama_cache.stats()}
+
+
+@router.get("/prefetch-stats")
+async def panorama_prefetch_stats(prefetcher: Optional[PanoramaPrefetcher] = Depends(get_panorama_prefetcher)):
+    """全景图邻近视角预取统计（预取、跳过、配额限制及失败次数）"""
+    if prefetcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **prefetcher.stats()}
@@ -1,80 +1,462 @@
 # api/summary_router.py
-from fastapi import APIRouter, HTTPException
-from typing import Dict, List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 from core.generator import EmergencySummaryGenerator
+from core.session import SummarySessionStore, SessionConflictError
+from core.coalescer import QACoalescer, PendingUpdate
+from core.cache import UncacheableResult
+from core.result_cache import SummaryResultCache, summary_request_key
+from core.json_repair import dump_summary, parse_summary
+from core.scheduler import Priority, SchedulerOverloaded, SlotLease, llm_priority
+from core.tracing import set_attr, span
 from core.models import JavaData, SummaryRequest, SummaryResponse, QAPair, QA, IncrementalSummaryRequest
+from core.models import BatchSummaryRequest, BatchSummaryItem, BatchSummaryResponse
+from config.settings import settings
 from loguru import logger
+import asyncio
+import json
 
 router = APIRouter(prefix="/summary", tags=["接警总结生成"])
 
 
+def get_generator(request: Request) -> EmergencySummaryGenerator:
+    """获取应用生命周期内共享的总结生成器"""
+    return request.app.state.generator
+
+
+def get_session_store(request: Request) -> SummarySessionStore:
+    """获取增量总结会话存储"""
+    return request.app.state.session_store
+
+
+def get_coalescer(request: Request) -> Optional[QACoalescer]:
+    """获取增量问答合并器（未开启合并窗口时为 None）"""
+    return request.app.state.coalescer
+
+
+def get_result_cache(request: Request) -> Optional[SummaryResultCache]:
+    """获取完整总结结果缓存（未启用时为 None）"""
+    return request.app.state.result_cache
+
+
 @router.post("/generate", response_model=SummaryResponse)
-async def generate_summary(request: JavaData):
+async def generate_summary(
+    request: JavaData,
+    http_response: Response,
+    generator: EmergencySummaryGenerator = Depends(get_generator),
+    result_cache: Optional[SummaryResultCache] = Depends(get_result_cache)
+):
     """
     生成接警指引总结
     - summaryType=1: 合并所有报警人信息生成总结
     - summaryType=2: 仅基于主报警人生成总结（但依然可传多人数据）
+    - 响应头 X-Summary-Cache：HIT（缓存命中）/ COALESCED（合并到进行中的相同请求）/ MISS
     """
     try:
-        if not request.allAnswers:
-            raise HTTPException(status_code=400, detail="报警记录不能为空")
-        if not request.guideTypeName:
-            raise HTTPException(status_code=400, detail="指引类型不能为空")
-        if not request.prompt:
-            raise HTTPException(status_code=400, detail="提示词不能为空")
+        with span("request.validate"):
+            validate_java_data(request)
 
         # 转换请求
-        summary_request = convert_java_data(request)
-        generator = EmergencySummaryGenerator()
+        with span("request.convert"):
+            summary_request = convert_java_data(request)
 
-        # 生成总结
-        response = await generator.generate_summary(summary_request)
+        # 生成总结（相同请求复用缓存结果，并发的相同请求只调用一次大模型）
+        response, cache_status = await _generate_with_cache(
+            summary_request, generator, result_cache)
+        if cache_status:
+            http_response.headers["X-Summary-Cache"] = cache_status
         return response
 
+    except SchedulerOverloaded as e:
+        raise _overloaded_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"生成总结失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
 
 
+@router.post("/generate_batch", response_model=BatchSummaryResponse)
+async def generate_summary_batch(
+    request: BatchSummaryRequest,
+    generator: EmergencySummaryGenerator = Depends(get_generator),
+    result_cache: Optional[SummaryResultCache] = Depends(get_result_cache)
+):
+    """
+    批量生成接警指引总结
+    - 各案件并发生成，同时进行的数量不超过 SUMMARY_BATCH_CONCURRENCY
+    - 单个案件失败只在该条结果中报告 error，不影响其他案件
+    - stream=false：全部完成后按请求顺序返回；stream=true：以 NDJSON 按完成顺序逐条返回
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="批量请求不能为空")
+    if len(request.items) > settings.SUMMARY_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"单次批量请求最多 {settings.SUMMARY_BATCH_MAX_ITEMS} 条")
+
+    # 批量任务的大模型调用排在实时请求之后
+    llm_priority.set(Priority.BATCH)
+    semaphore = asyncio.Semaphore(settings.SUMMARY_BATCH_CONCURRENCY)
+
+    async def run(index: int, item: JavaData) -> BatchSummaryItem:
+        async with semaphore:
+            try:
+                validate_java_data(item)
+                response, _ = await _generate_with_cache(
+                    convert_java_data(item), generator, result_cache)
+                return BatchSummaryItem(index=index, case_id=item.incidentId,
+                                        success=True, summary=response.summary)
+            except HTTPException as e:
+                return BatchSummaryItem(index=index, case_id=item.incidentId,
+                                        success=False, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"批量生成总结失败, 案件ID={item.incidentId}: {str(e)}")
+                return BatchSummaryItem(index=index, case_id=item.incidentId,
+                                        success=False, error=f"生成失败: {str(e)}")
+
+    tasks = [asyncio.ensure_future(run(i, item))
+             for i, item in enumerate(request.items)]
+
+    if not request.stream:
+        return BatchSummaryResponse(results=await asyncio.gather(*tasks))
+
+    async def lines():
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield result.model_dump_json() + "\n"
+        finally:
+            # 客户端断开时取消尚未完成的案件
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def _generate_with_cache(
+    summary_request: SummaryRequest,
+    generator: EmergencySummaryGenerator,
+    result_cache: Optional[SummaryResultCache]
+) -> Tuple[SummaryResponse, Optional[str]]:
+    """带结果缓存的完整总结生成，返回 (响应, 缓存状态)；未启用缓存时状态为 None"""
+    if result_cache is None:
+        return await generator.generate_summary(summary_request), None
+
+    key = summary_request_key(
+        summary_request, generator.model, generator.temperature)
+
+    async def load() -> str:
+        response = await generator.generate_summary(summary_request)
+        if not response.valid:
+            # 未通过结构校验的输出照常返回，但不缓存，Java 后台重试时重新生成
+            raise UncacheableResult(response.summary)
+        return response.summary
+
+    with span("summary.cache") as s:
+        summary, cache_status = await result_cache.get_or_load(key, load)
+        set_attr(s, "status", cache_status)
+    return SummaryResponse(
+        case_id=summary_request.case_id,
+        summary=summary,
+        guidance_type=summary_request.guidance_type
+    ), cache_status
+
+
 @router.post("/generate_incremental", response_model=SummaryResponse)
-async def generate_incremental_summary(request: IncrementalSummaryRequest):
+async def generate_incremental_summary(
+    request: IncrementalSummaryRequest,
+    http_response: Response,
+    generator: EmergencySummaryGenerator = Depends(get_generator),
+    sessions: SummarySessionStore = Depends(get_session_store),
+    coalescer: Optional[QACoalescer] = Depends(get_coalescer)
+):
     """
     增量式生成单报警人总结（summary_type=2 格式）
-    - 每次传入一个问答对 + 当前历史总结
-    - 返回更新后的完整总结（JSON格式）
+    - 每次传入一个问答对；历史总结由服务端按 (case_id, caller_id) 保存，也可显式传入 current_summary
+    - version 为本次更新序号，不大于服务端已记录版本时返回 409
+    - 开启合并窗口时，窗口期内同一报警人的多个问答合并为一次生成，所有请求返回同一结果
+    - 返回更新后的完整总结（JSON格式），响应头 X-Summary-Version 为保存后的版本号
     """
+    # 实时增量更新优先于完整总结与批量任务
+    llm_priority.set(Priority.INCREMENTAL)
     try:
         # 可选：校验参数
         if not request.question or not request.answer:
             raise HTTPException(status_code=400, detail="问题或回答不能为空")
 
-        generator = EmergencySummaryGenerator()
+        update = (request.version, [
+                  QAPair(question=request.question, answer=request.answer)])
 
-        # 构建单个报警人的 QA 数据
-        qa_pair = QAPair(question=request.question, answer=request.answer)
-        qa_item = QA(
-            caller_id=request.caller_id,  # 可自定义或传入
-            qa_pairs=[qa_pair]
-        )
+        async def apply(updates):
+            return await _apply_incremental_updates(request, updates, generator, sessions)
 
-        summary_request = SummaryRequest(
-            case_id=request.case_id,
-            guidance_type=request.guidance_type,
-            prompt=request.prompt,
-            summary_type=2,  # 使用单人格式
-            qa_list=[qa_item],
-            case_context=request.current_summary  # 把历史摘要作为上下文传入
-        )
+        if coalescer is not None and request.current_summary is None:
+            # 窗口期内同一报警人的问答合并为一次大模型调用，过期版本提前拒绝
+            sessions.next_version(sessions.get(
+                request.case_id, request.caller_id), request.version)
+            response, version = await coalescer.submit(
+                (request.case_id, request.caller_id), update, apply)
+        else:
+            response, version = await apply([update])
 
-        # 生成增量总结
-        response = await generator.generate_incremental_summary(summary_request)
+        http_response.headers["X-Summary-Version"] = str(version)
         return response
 
+    except SessionConflictError as e:
+        logger.warning(f"增量更新版本冲突, 案件ID={request.case_id}: {e}")
+        raise HTTPException(status_code=409, detail=str(e))
+    except SchedulerOverloaded as e:
+        raise _overloaded_error(e)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"增量生成总结失败: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"生成失败: {str(e)}")
 
 
+async def _apply_incremental_updates(
+    request: IncrementalSummaryRequest,
+    updates: List[PendingUpdate],
+    generator: EmergencySummaryGenerator,
+    sessions: SummarySessionStore
+) -> Tuple[SummaryResponse, int]:
+    """在报警人锁内基于最新摘要应用一批问答（按版本号排序），保存并返回结果及版本号"""
+    versions = [v for v, _ in updates if v is not None]
+    if len(versions) == len(updates):
+        updates = sorted(updates, key=lambda u: u[0])
+    qa_pairs = [pair for _, pairs in updates for pair in pairs]
+
+    # 同一报警人的更新串行执行，保证基于上一次的摘要
+    async with sessions.lock(request.case_id, request.caller_id):
+        state = sessions.get(request.case_id, request.caller_id)
+        version = sessions.next_version(
+            state, max(versions) if versions else None)
+        summary_request = convert_incremental_request(
+            request, state.summary if state else None, qa_pairs)
+
+        # 生成增量总结
+        with span("summary.incremental", version=version):
+            response = await generator.generate_incremental_summary(summary_request)
+        sessions.save(request.case_id, request.caller_id,
+                      response.summary, version)
+
+    return response, version
+
+
+@router.post("/generate_stream")
+async def generate_summary_stream(
+    request: JavaData,
+    generator: EmergencySummaryGenerator = Depends(get_generator)
+):
+    """
+    流式生成接警指引总结（Server-Sent Events）
+    - token 事件：大模型输出的增量文本
+    - done 事件：最终完整总结（与 /generate 返回结构一致，附 valid 表示是否为合法 JSON）
+    - error 事件：生成过程中出错
+    调用名额在返回响应前获取，过载时直接返回 429 + Retry-After
+    """
+    validate_java_data(request)
+
+    summary_request = convert_java_data(request)
+    lease = await _acquire_stream_slot(generator)
+    return _sse_response(
+        generator.stream_summary(summary_request, lease=lease),
+        summary_request,
+        lease=lease
+    )
+
+
+@router.post("/generate_incremental_stream")
+async def generate_incremental_summary_stream(
+    request: IncrementalSummaryRequest,
+    generator: EmergencySummaryGenerator = Depends(get_generator),
+    sessions: SummarySessionStore = Depends(get_session_store)
+):
+    """
+    流式增量生成单报警人总结（Server-Sent Events），事件格式同 /generate_stream
+    生成完成后保存到服务端会话，版本号规则同 /generate_incremental
+    """
+    if not request.question or not request.answer:
+        raise HTTPException(status_code=400, detail="问题或回答不能为空")
+
+    llm_priority.set(Priority.INCREMENTAL)
+    state = sessions.get(request.case_id, request.caller_id)
+    try:
+        version = sessions.next_version(state, request.version)
+    except SessionConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    def save_session(summary: str):
+        # 流式生成期间可能已有更新的版本写入，此时 save 会放弃本次结果
+        if sessions.save(request.case_id, request.caller_id, summary, version) is None:
+            logger.warning(f"流式增量结果已过期未保存, 案件ID={request.case_id}, 版本={version}")
+
+    summary_request = convert_incremental_request(
+        request, state.summary if state else None)
+    lease = await _acquire_stream_slot(generator)
+    return _sse_response(
+        generator.stream_summary(summary_request, incremental=True, lease=lease),
+        summary_request,
+        lease=lease,
+        on_complete=save_session,
+        headers={"X-Summary-Version": str(version)}
+    )
+
+
+@router.get("/cache-stats")
+async def summary_cache_stats(result_cache: Optional[SummaryResultCache] = Depends(get_result_cache)):
+    """完整总结结果缓存统计（命中率、合并请求数、内存占用）"""
+    if result_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **result_cache.stats()}
+
+
+@router.get("/prompt-templates")
+async def prompt_template_stats(generator: EmergencySummaryGenerator = Depends(get_generator)):
+    """提示词模板统计：各模板固定前缀的 token 估算及缓存命中情况"""
+    return generator.prompts.stats()
+
+
+@router.get("/output-stats")
+async def summary_output_stats(generator: EmergencySummaryGenerator = Depends(get_generator)):
+    """结构化输出统计：直接解析、本地修复、重新请求及失败的次数与占比"""
+    return generator.output_stats_report()
+
+
+@router.get("/scheduler-stats")
+async def llm_scheduler_stats(generator: EmergencySummaryGenerator = Depends(get_generator)):
+    """大模型调用调度统计：并发数、各优先级排队数、准入/拒绝/超时次数"""
+    return generator.scheduler.stats()
+
+
+@router.get("/llm-backends")
+async def llm_backend_stats(generator: EmergencySummaryGenerator = Depends(get_generator)):
+    """大模型后端状态：延迟与错误率评分、熔断状态、对冲与切换次数"""
+    return generator.router.stats()
+
+
+def _overloaded_error(e: SchedulerOverloaded) -> HTTPException:
+    """大模型调用排队过载：429 + Retry-After"""
+    return HTTPException(status_code=429, detail=str(e),
+                         headers={"Retry-After": str(e.retry_after_seconds)})
+
+
+async def _acquire_stream_slot(generator: EmergencySummaryGenerator) -> SlotLease:
+    """流式接口在返回响应前获取调用名额，过载时返回 429（响应开始后只能以 error 事件报告）"""
+    try:
+        return await generator.scheduler.acquire()
+    except SchedulerOverloaded as e:
+        raise _overloaded_error(e)
+
+
+class _LeasedStreamingResponse(StreamingResponse):
+    """响应发送结束（含客户端断开、流未开始即失败）时归还调用名额"""
+
+    def __init__(self, *args, lease: SlotLease, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lease = lease
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.lease.release()
+
+
+def _sse(event: str, data: dict) -> str:
+    """格式化一条 SSE 事件"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(
+    deltas: AsyncIterator[str],
+    summary_request: SummaryRequest,
+    lease: SlotLease,
+    on_complete: Optional[Callable[[str], None]] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> StreamingResponse:
+    """把大模型增量输出转发为 SSE，结束时发送校验后的完整总结；lease 为本次流式调用的名额"""
+
+    async def events():
+        parts = []
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                yield _sse("token", {"content": delta})
+
+            summary = "".join(parts).strip()
+            # 流式输出已发给客户端，无法重新请求：只做本地修复并规范化
+            try:
+                payload, _ = parse_summary(summary)
+                summary = dump_summary(payload)
+                valid = True
+            except ValueError as e:
+                valid = False
+                logger.warning(f"流式总结不是合法 JSON, 案件ID={summary_request.case_id}: {e}")
+
+            response = SummaryResponse(
+                case_id=summary_request.case_id,
+                summary=summary,
+                guidance_type=summary_request.guidance_type
+            )
+            if on_complete is not None:
+                on_complete(summary)
+            yield _sse("done", {**response.model_dump(), "valid": valid})
+        except SchedulerOverloaded as e:
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after_seconds})
+        except Exception as e:
+            logger.error(f"流式生成总结失败: {str(e)}", exc_info=True)
+            yield _sse("error", {"detail": f"生成失败: {str(e)}"})
+
+    return _LeasedStreamingResponse(
+        events(),
+        lease=lease,
+        media_type="text/event-stream",
+        # 禁止代理缓冲，保证增量内容及时到达
+        headers={"Cache-Control": "no-cache",
+                 "X-Accel-Buffering": "no", **(headers or {})}
+    )
+
+
+def validate_java_data(java_data: JavaData):
+    """校验 Java 请求数据，不合法时抛出 400"""
+    if not java_data.allAnswers:
+        raise HTTPException(status_code=400, detail="报警记录不能为空")
+    if not java_data.guideTypeName:
+        raise HTTPException(status_code=400, detail="指引类型不能为空")
+    if not java_data.prompt:
+        raise HTTPException(status_code=400, detail="提示词不能为空")
+
+
+def convert_incremental_request(
+    request: IncrementalSummaryRequest,
+    stored_summary: Optional[str] = None,
+    qa_pairs: Optional[List[QAPair]] = None
+) -> SummaryRequest:
+    """
+    将增量请求转换为单报警人的 SummaryRequest
+    - 未传 current_summary 时使用服务端保存的摘要
+    - qa_pairs 为合并后的多个问答，不传则使用请求中的单个问答
+    """
+    # 构建单个报警人的 QA 数据
+    if qa_pairs is None:
+        qa_pairs = [QAPair(question=request.question, answer=request.answer)]
+    qa_item = QA(
+        caller_id=request.caller_id,  # 可自定义或传入
+        qa_pairs=qa_pairs
+    )
+
+    return SummaryRequest(
+        case_id=request.case_id,
+        guidance_type=request.guidance_type,
+        prompt=request.prompt,
+        summary_type=2,  # 使用单人格式
+        qa_list=[qa_item],
+        case_context=request.current_summary or stored_summary  # 把历史摘要作为上下文传入
+    )
+
+
 def convert_java_data(java_data: JavaData) -> SummaryRequest:
     """将 Java 数据转换为 SummaryRequest"""
 
@@ -0,0 +1,56 @@
+"""
+生产环境启动入口（多 worker，无热重载）
+- worker 数、监听地址及优雅关闭等待时间来自配置（SERVE_*），可用命令行参数覆盖
+- 已安装 uvloop / httptools 时自动启用（Windows 下不可用，退回 asyncio / h11）
+- 收到停止信号后不再接收新连接，等待进行中的请求（含流式响应）在期限内完成
+- 多 worker 且未配置 SHARED_STORE_PATH 时，默认使用 cache/shared.db 在 worker 间共享缓存、会话与限流计数
+
+用法：python serve.py --workers 4 --port 8000
+"""
+import argparse
+import importlib.util
+import os
+
+import uvicorn
+
+from config.settings import settings
+
+DEFAULT_SHARED_STORE = os.path.join("cache", "shared.db")
+
+
+def _available(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指引总结服务生产启动")
+    parser.add_argument("--host", default=settings.SERVE_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVE_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVE_WORKERS)
+    parser.add_argument("--graceful-timeout", type=int, default=settings.SERVE_GRACEFUL_TIMEOUT,
+                        help="关闭时等待进行中请求的秒数")
+    args = parser.parse_args()
+
+    # worker 进程重新导入配置，通过环境变量传递 worker 数与共享存储路径
+    os.environ["WEB_CONCURRENCY"] = str(args.workers)
+    if args.workers > 1 and not settings.SHARED_STORE_PATH:
+        os.environ["SHARED_STORE_PATH"] = DEFAULT_SHARED_STORE
+
+    loop = "uvloop" if _available("uvloop") else "asyncio"
+    http = "httptools" if _available("httptools") else "h11"
+    print(f"启动指引总结服务: {args.host}:{args.port} workers={args.workers} loop={loop} http={http}")
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http=http,
+        timeout_graceful_shutdown=args.graceful_timeout,
+        reload=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -80,8 +80,8 @@ echo    访问 http://localhost:8000/api/v1/routes 查看 API 路由
 echo    按 Ctrl+C 停止服务
 echo.
 
-:: 启动主程序
-python main.py
+:: 启动主程序（生产模式：多 worker、无热重载，worker 数见 .env 中的 SERVE_WORKERS）
+python serve.py
 
 :: 服务停止后提示
 echo.
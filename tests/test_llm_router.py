@@ -0,0 +1,34 @@
+import asyncio
+from types import SimpleNamespace
+
+from config.settings import settings
+from core.llm_router import LLMBackend, LLMRouter
+
+
+def _backend(name: str, delay: float) -> LLMBackend:
+    """使用固定延迟的假客户端构造后端（不发起网络请求）"""
+    async def create(model, stream, **kwargs):
+        await asyncio.sleep(delay)
+        return name
+
+    backend = LLMBackend(name=name, model="m", base_url="http://unused", api_key="k")
+    backend._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return backend
+
+
+def test_slow_primary_loses_hedges_and_router_switches(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY", 0.05)
+    slow, fast = _backend("slow", 0.5), _backend("fast", 0.01)
+    router = LLMRouter([slow, fast])
+
+    async def run():
+        return [await router.chat(messages=[]) for _ in range(6)]
+
+    results = asyncio.run(run())
+
+    assert results == ["fast"] * 6
+    # 首次调用慢后端在对冲中落败，记录下限延迟后不再被优先选中
+    assert router.hedged == 1
+    assert slow.ewma_latency is not None and slow.ewma_latency > fast.ewma_latency
+    assert router.select() is fast